@@ -1,6 +1,10 @@
 from __future__ import absolute_import
+import os
 import time
 import socket
+import selectors
+import threading
+import weakref
 import six
 
 import requests
@@ -16,6 +20,12 @@ from six.moves.http_client import HTTPConnection
 import errno
 
 DEFAULT_POOLBLOCK = False
+POOL_NUM_POOLS = 20  # hosts kept in the shared pool manager
+POOL_MAXSIZE = 4  # idle keep-alive connections kept per host
+POOL_IDLE_TIMEOUT = 60  # seconds before an idle connection is closed
+HAPPY_EYEBALLS_DELAY = 0.25  # seconds before racing the next resolved address
+ABORT_POLL_INTERVAL = 0.5  # seconds between ABORT_FLAG_FUNCTION checks while connecting
+DEFAULT_SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
 SSL_KEYWORDS = ('key_file', 'cert_file', 'cert_reqs', 'ca_certs',
                 'ssl_version')
 
@@ -70,83 +80,210 @@ class AsyncTimeout(float):
 DEFAULT_TIMEOUT = AsyncTimeout(10).setConnectTimeout(10)
 
 
-class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
-    def __init__(self, *args, **kwargs):
-        VerifiedHTTPSConnection.__init__(self, *args, **kwargs)
+class AsyncConnector(object):
+    """
+    Event driven non-blocking connect.
+
+    Waits on socket writability (and on a cancel self-pipe, so cancel() wakes
+    it up immediately) instead of polling. Addresses returned by getaddrinfo
+    are raced happy-eyeballs style: a new attempt is started every
+    HAPPY_EYEBALLS_DELAY seconds, or as soon as one fails, alternating
+    address families, and the first attempt to complete wins.
+    """
+    def __init__(self):
         self._canceled = False
-        self.deadline = 0
-        self._timeout = AsyncTimeout(DEFAULT_TIMEOUT)
+        self._wakeR = None
+        self._wakeW = None
+        self.timings = {}
+
+    def cancel(self):
+        self._canceled = True
+        wakeW = self._wakeW
+        if wakeW is not None:
+            try:
+                wakeW.send(b'x')
+            except socket.error:
+                pass
+
+    def isCanceled(self):
+        return self._canceled or ABORT_FLAG_FUNCTION()
+
+    def connect(self, address, timeout, source_address=None, socket_options=None):
+        host, port = address
+
+        start = time.time()
+        infos = self._interleave(socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM))
+        self.timings['dns'] = time.time() - start
 
-    def _check_timeout(self):
-        if time.time() > self.deadline:
-            raise TimeoutException('connection timed out')
+        if not infos:
+            raise socket.error("getaddrinfo returns an empty list")
+
+        start = time.time()
+        deadline = start + timeout.getConnectTimeout()
+        self._wakeR, self._wakeW = socket.socketpair()
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeR, selectors.EVENT_READ)
+        pending = []
+        nextAttempt = 0
+        err = None
+
+        try:
+            while True:
+                if self.isCanceled():
+                    raise CanceledException('Request canceled')
+
+                now = time.time()
+                if now > deadline:
+                    raise TimeoutException('connection timed out')
+
+                if infos and (not pending or now >= nextAttempt):
+                    sock, status = self._startAttempt(infos.pop(0), source_address, socket_options)
+                    if sock is None:
+                        err = status
+                        continue
+
+                    if status in (0, errno.EISCONN, WIN_EISCONN):
+                        self.timings['connect'] = time.time() - start
+                        sock.setblocking(True)
+                        return sock
+
+                    pending.append(sock)
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    nextAttempt = now + HAPPY_EYEBALLS_DELAY
+                    continue
+
+                if not pending:
+                    raise err
+
+                wakeAt = deadline
+                if infos:
+                    wakeAt = min(wakeAt, nextAttempt)
+
+                # ABORT_FLAG_FUNCTION can't wake us, so don't sleep past ABORT_POLL_INTERVAL
+                for key, events in selector.select(max(0, min(wakeAt - now, ABORT_POLL_INTERVAL))):
+                    sock = key.fileobj
+                    if sock is self._wakeR:
+                        continue
+
+                    selector.unregister(sock)
+                    pending.remove(sock)
+
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error:
+                        err = socket.error(error, os.strerror(error))
+                        sock.close()
+                        nextAttempt = 0
+                        continue
+
+                    self.timings['connect'] = time.time() - start
+                    sock.setblocking(True)
+                    return sock
+        finally:
+            for sock in pending:
+                sock.close()
+
+            selector.close()
+            self._wakeW.close()
+            self._wakeR.close()
+            self._wakeW = self._wakeR = None
+
+    def _startAttempt(self, info, source_address, socket_options):
+        af, socktype, proto, canonname, sa = info
+        sock = None
+        try:
+            sock = socket.socket(af, socktype, proto)
+            for opt in socket_options or ():
+                sock.setsockopt(*opt)
+            sock.setblocking(False)  # this is obviously critical
+
+            if source_address:
+                sock.bind(source_address)
+
+            status = sock.connect_ex(sa)
+        except socket.error as e:
+            if sock is not None:
+                sock.close()
+            return None, e
+
+        if status not in (0, errno.EISCONN, WIN_EISCONN, errno.EINPROGRESS, errno.EWOULDBLOCK, WIN_EWOULDBLOCK):
+            sock.close()
+            return None, socket.error(status, os.strerror(status))
+
+        return sock, status
+
+    def _interleave(self, infos):
+        # Alternate address families, keeping the resolver's preferred one first
+        families = []
+        byFamily = {}
+        for info in infos:
+            if info[0] not in byFamily:
+                families.append(info[0])
+                byFamily[info[0]] = []
+            byFamily[info[0]].append(info)
+
+        interleaved = []
+        while any(byFamily.values()):
+            for af in families:
+                if byFamily[af]:
+                    interleaved.append(byFamily[af].pop(0))
+
+        return interleaved
+
+
+class AsyncConnectionMixin(object):
+    """
+    Connects through an :class:`AsyncConnector` so the connect can be canceled
+    and records per-phase timings (dns, connect, tls) in ``self.timings``.
+    """
+    _canceled = False
+    _connector = None
 
     def create_connection(self, address, timeout=None, source_address=None):
-        """Connect to *address* and return the socket object.
-
-        Convenience function.  Connect to *address* (a 2-tuple ``(host,
-        port)``) and return the socket object.  Passing the optional
-        *timeout* parameter will set the timeout on the socket instance
-        before attempting to connect.  If no *timeout* is supplied, the
-        global default timeout setting returned by :func:`getdefaulttimeout`
-        is used.  If *source_address* is set it must be a tuple of (host, port)
-        for the socket to bind as a source address before making the connection.
-        An host of '' or port 0 tells the OS to use the default.
+        """Connect to *address* (a 2-tuple ``(host, port)``) and return the
+        socket object. *timeout* is the connect deadline and stays set on the
+        returned (blocking) socket, so sending the request can't hang on a
+        server that stopped reading; urllib3 switches to the read timeout
+        once the request is sent. If *source_address* is set it must be a
+        tuple of (host, port) for the socket to bind as a source address before
+        making the connection. An host of '' or port 0 tells the OS to use the
+        default.
         """
+        self.timings = {}
+        self._connector = AsyncConnector()
+        if self._canceled:
+            self._connector.cancel()
+
         timeout = AsyncTimeout.fromTimeout(timeout)
-        self._timeout = timeout
+        try:
+            sock = self._connector.connect(
+                address,
+                timeout,
+                source_address=source_address,
+                socket_options=getattr(self, 'socket_options', None) or DEFAULT_SOCKET_OPTIONS
+            )
+        finally:
+            self.timings.update(self._connector.timings)
+            self._connector = None
+
+        sock.settimeout(float(timeout))
+        return sock
 
-        host, port = address
-        err = None
-        for res in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
-            af, socktype, proto, canonname, sa = res
-            sock = None
+    def cancel(self):
+        self._canceled = True
+        connector = self._connector
+        if connector:
+            connector.cancel()
+
+        # Also unblock a request that's already waiting on the server
+        sock = getattr(self, 'sock', None)
+        if sock is not None:
             try:
-                sock = socket.socket(af, socktype, proto)
-                sock.setblocking(False)  # this is obviously critical
-                self.deadline = time.time() + timeout.getConnectTimeout()
-                # sock.settimeout(timeout)
-
-                if source_address:
-                    sock.bind(source_address)
-                for msg in self._connect(sock, sa):
-                    if self._canceled or ABORT_FLAG_FUNCTION():
-                        raise CanceledException('Request canceled')
-                sock.setblocking(True)
-                return sock
-
-            except socket.error as _:
-                err = _
-                if sock is not None:
-                    sock.shutdown(socket.SHUT_RDWR)
-                    sock.close()
-
-        if err is not None:
-            raise err
-        else:
-            raise socket.error("getaddrinfo returns an empty list")
+                sock.shutdown(socket.SHUT_RDWR)
+            except (socket.error, OSError):
+                pass
 
-    def _connect(self, sock, sa):
-        while not self._canceled and not ABORT_FLAG_FUNCTION():
-            time.sleep(0.01)
-            self._check_timeout()  # this should be done at the beginning of each loop
-            status = sock.connect_ex(sa)
-            if not status or status in (errno.EISCONN, WIN_EISCONN):
-                break
-            elif status in (errno.EINPROGRESS, WIN_EWOULDBLOCK):
-                self.deadline = time.time() + self._timeout.getConnectTimeout()
-            # elif status in (errno.EWOULDBLOCK, errno.EALREADY) or (os.name == 'nt' and status == errno.WSAEINVAL):
-            #     pass
-            yield
-
-        if self._canceled or ABORT_FLAG_FUNCTION():
-            raise CanceledException('Request canceled')
-
-        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
-        if error:
-            # TODO: determine when this case can actually happen
-            raise socket.error((error,))
 
+class AsyncVerifiedHTTPSConnection(AsyncConnectionMixin, VerifiedHTTPSConnection):
     def _new_conn(self):
         sock = self.create_connection(
             address=(self.host, self.port),
@@ -155,25 +292,84 @@ class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
 
         return sock
 
-    def cancel(self):
-        self._canceled = True
+    def connect(self):
+        start = time.time()
+        VerifiedHTTPSConnection.connect(self)
+        self.timings['tls'] = time.time() - start - self.timings.get('dns', 0) - self.timings.get('connect', 0)
+        POOL_MANAGER.countConnect(self.timings)
 
 
-class AsyncHTTPConnection(HTTPConnection):
-    def __init__(self, *args, **kwargs):
-        HTTPConnection.__init__(self, *args, **kwargs)
-        self._canceled = False
-        self.deadline = 0
+class AsyncHTTPConnection(AsyncConnectionMixin, HTTPConnection):
+    def connect(self):
+        self.sock = self.create_connection(
+            address=(self.host, self.port),
+            timeout=self.timeout,
+            source_address=self.source_address
+        )
+        POOL_MANAGER.countConnect(self.timings)
 
-    def cancel(self):
-        self._canceled = True
+        if self._tunnel_host:
+            self._tunnel()
 
 
-class AsyncHTTPConnectionPool(HTTPConnectionPool):
-    def __init__(self, *args, **kwargs):
-        HTTPConnectionPool.__init__(self, *args, **kwargs)
-        self.connections = []
+class PooledConnectionsMixin(object):
+    """
+    Hands out connections for the shared pool manager: tracks which adapter a
+    connection is checked out to (so it can be canceled individually), closes
+    connections that went idle for too long and never reuses canceled ones.
+    """
+    def _get_conn(self, timeout=None):
+        conn = super(PooledConnectionsMixin, self)._get_conn(timeout)
 
+        if conn.sock is not None and time.time() - getattr(conn, '_lastUsed', 0) > POOL_IDLE_TIMEOUT:
+            conn.close()
+            POOL_MANAGER.countEviction()
+
+        POOL_MANAGER.countCheckout(conn.sock is not None)
+
+        owner = getattr(_OWNER, 'adapter', None)
+        conn._canceled = False
+        conn._owner = owner
+        if owner:
+            owner.track(conn)
+
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            owner = getattr(conn, '_owner', None)
+            conn._owner = None
+            if owner:
+                owner.release(conn)
+
+            if getattr(conn, '_canceled', False):
+                conn.close()
+                conn = None
+            else:
+                conn._lastUsed = time.time()
+
+        super(PooledConnectionsMixin, self)._put_conn(conn)
+
+    def evictIdle(self, maxIdle=POOL_IDLE_TIMEOUT):
+        pool = self.pool
+        if pool is None:
+            return 0
+
+        evicted = 0
+        now = time.time()
+        with pool.mutex:
+            for conn in pool.queue:
+                if conn is None or conn.sock is None:
+                    continue
+
+                if now - getattr(conn, '_lastUsed', 0) > maxIdle:
+                    conn.close()
+                    evicted += 1
+
+        return evicted
+
+
+class AsyncHTTPConnectionPool(PooledConnectionsMixin, HTTPConnectionPool):
     def _new_conn(self):
         """
         Return a fresh :class:`httplib.HTTPConnection`.
@@ -193,20 +389,10 @@ class AsyncHTTPConnectionPool(HTTPConnectionPool):
             # Mark this connection as not reusable
             conn.auto_open = 0
 
-        self.connections.append(conn)
-
         return conn
 
-    def cancel(self):
-        for c in self.connections:
-            c.cancel()
-
-
-class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
-    def __init__(self, *args, **kwargs):
-        HTTPSConnectionPool.__init__(self, *args, **kwargs)
-        self.connections = []
 
+class AsyncHTTPSConnectionPool(PooledConnectionsMixin, HTTPSConnectionPool):
     def _new_conn(self):
         """
         Return a fresh :class:`httplib.HTTPSConnection`.
@@ -226,14 +412,8 @@ class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
             extra_params['strict'] = self.strict
         connection = connection_class(host=actual_host, port=actual_port, timeout=self.timeout.connect_timeout, **extra_params)
 
-        self.connections.append(connection)
-
         return self._prepare_conn(connection)
 
-    def cancel(self):
-        for c in self.connections:
-            c.cancel()
-
 
 pool_classes_by_scheme = {
     'http': AsyncHTTPConnectionPool,
@@ -242,6 +422,17 @@ pool_classes_by_scheme = {
 
 
 class AsyncPoolManager(PoolManager):
+    def __init__(self, *args, **kwargs):
+        PoolManager.__init__(self, *args, **kwargs)
+        self._statsLock = threading.Lock()
+        self._allPools = weakref.WeakSet()
+        self._lastSweep = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.connects = 0
+        self.connectTimings = {'dns': 0, 'connect': 0, 'tls': 0}
+
     def _new_pool(self, scheme, host, port, request_context=None):
         """
         Create a new :class:`ConnectionPool` based on host, port and scheme.
@@ -257,19 +448,100 @@ class AsyncPoolManager(PoolManager):
             for kw in SSL_KEYWORDS:
                 kwargs.pop(kw, None)
 
-        return pool_cls(host, port, **kwargs)
+        pool = pool_cls(host, port, **kwargs)
+        self._allPools.add(pool)
+        return pool
+
+    def countCheckout(self, reused):
+        with self._statsLock:
+            if reused:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+            sweep = time.time() - self._lastSweep > POOL_IDLE_TIMEOUT
+            if sweep:
+                self._lastSweep = time.time()
+
+        if sweep:
+            self.evictIdle()
+
+    def countConnect(self, timings):
+        with self._statsLock:
+            self.connects += 1
+            for phase, value in timings.items():
+                self.connectTimings[phase] = self.connectTimings.get(phase, 0) + value
+
+    def countEviction(self, count=1):
+        with self._statsLock:
+            self.evictions += count
+
+    def evictIdle(self, maxIdle=POOL_IDLE_TIMEOUT):
+        evicted = 0
+        for pool in list(self._allPools):
+            evicted += pool.evictIdle(maxIdle)
+
+        if evicted:
+            self.countEviction(evicted)
+
+        return evicted
+
+    def getStats(self):
+        with self._statsLock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'pools': len(self.pools),
+                'connects': self.connects,
+                'avgConnectTimings': dict(
+                    (phase, round(total / max(self.connects, 1), 4)) for phase, total in self.connectTimings.items()
+                )
+            }
+
+
+POOL_MANAGER = AsyncPoolManager(num_pools=POOL_NUM_POOLS, maxsize=POOL_MAXSIZE, block=DEFAULT_POOLBLOCK)
+
+# The adapter currently sending a request on this thread. Connections checked
+# out of the shared pools are attributed to it so it can cancel only its own.
+_OWNER = threading.local()
 
 
 class AsyncHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args, **kwargs):
+        self._activeConnections = set()
+        self._activeLock = threading.Lock()
+        HTTPAdapter.__init__(self, *args, **kwargs)
+
+    def track(self, conn):
+        with self._activeLock:
+            self._activeConnections.add(conn)
+
+    def release(self, conn):
+        with self._activeLock:
+            self._activeConnections.discard(conn)
+
     def cancel(self):
-        for c in self.connections:
+        with self._activeLock:
+            connections = list(self._activeConnections)
+
+        for c in connections:
             c.cancel()
 
+    def close(self):
+        # The pool manager is shared process-wide, so only drop what's ours
+        self.cancel()
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
     def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK):
         """Initializes a urllib3 PoolManager. This method should not be called
         from user code, and is only exposed for use when subclassing the
         :class:`HTTPAdapter <requests.adapters.HTTPAdapter>`.
 
+        All adapters share the process-wide :data:`POOL_MANAGER`, so keep-alive
+        connections are reused across sessions.
+
         :param connections: The number of urllib3 connection pools to cache.
         :param maxsize: The maximum number of connections to save in the pool.
         :param block: Block when no free connections are available.
@@ -279,8 +551,7 @@ class AsyncHTTPAdapter(HTTPAdapter):
         self._pool_maxsize = maxsize
         self._pool_block = block
 
-        self.poolmanager = AsyncPoolManager(num_pools=connections, maxsize=maxsize, block=block)
-        self.connections = []
+        self.poolmanager = POOL_MANAGER
 
     def get_connection(self, url, proxies=None):
         """Returns a urllib3 connection for the given URL. This should not be
@@ -312,9 +583,15 @@ class AsyncHTTPAdapter(HTTPAdapter):
             url = parsed.geturl()
             conn = self.poolmanager.connection_from_url(url)
 
-        self.connections.append(conn)
         return conn
 
+    def send(self, request, **kwargs):
+        _OWNER.adapter = self
+        try:
+            return HTTPAdapter.send(self, request, **kwargs)
+        finally:
+            _OWNER.adapter = None
+
 
 class Session(requests.Session):
     def __init__(self, *args, **kwargs):
@@ -324,5 +601,4 @@ class Session(requests.Session):
 
     def cancel(self):
         for v in self.adapters.values():
-            v.close()
             v.cancel()
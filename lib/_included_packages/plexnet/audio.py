@@ -17,8 +17,7 @@ class Audio(media.MediaItem):
         return not self.__eq__(other)
 
     def _setData(self, data):
-        for k, v in data.attrib.items():
-            setattr(self, k, plexobjects.PlexValue(v, self))
+        self._setAttribs(data.attrib)
 
         self.key = plexobjects.PlexValue(self.key.replace('/children', ''), self)
 
@@ -144,10 +143,23 @@ class Track(Audio):
     def getStreamURL(self, **params):
         return self._getStreamURL(**params)
 
+    def ensureMedia(self):
+        """
+        Tracks listed as part of an album or playlist usually come with their Media/Part elements, which
+        are only parsed for full objects. Parse them from the data we already have, so the stream can be
+        chosen without reloading the track. Returns whether the track has media.
+        """
+        if 'media' not in self.__dict__:
+            if self.data is None or self.data.find(media.Media.TYPE) is None:
+                return False
+            self.media = plexobjects.PlexMediaItemList(self.data, plexmedia.PlexMedia, media.Media.TYPE, initpath=self.initpath, server=self.server, media=self)
+
+        return bool(self.media)
+
     @property
     def defaultThumb(self):
-        return self.__dict__.get('thumb') or self.__dict__.get('parentThumb') or self.get('grandparentThumb')
+        return self.get('thumb') or self.get('parentThumb') or self.get('grandparentThumb')
 
     @property
     def defaultArt(self):
-        return self.__dict__.get('art') or self.get('grandparentArt')
+        return self.get('art') or self.get('grandparentArt')
@@ -0,0 +1,290 @@
+from __future__ import absolute_import
+import os
+import mmap
+import time
+import shutil
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+from . import http
+from . import util
+
+BIF_MAGIC = b'\x89BIF\r\n\x1a\n'
+BIF_HEADER_SIZE = 64
+BIF_DEFAULT_INTERVAL = 1000  # ms between frames when the header doesn't say
+BIF_CHUNK_SIZE = 64 * 1024
+BIF_FRAME_CACHE_SIZE = 120  # extracted frames kept on disk
+BIF_PREFETCH = 6  # frames extracted ahead in the seek direction
+
+
+class BifError(Exception):
+    pass
+
+
+class BifIndex(object):
+    """
+    A memory mapped BIF file (Roku's "base index frames" format): a 64 byte header, a table of
+    (timestamp, offset) pairs and the JPEG frames. Frames are evenly spaced, so the frame for an
+    offset is a division away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            try:
+                self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                self.data = self.file.read()
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        data = self.data
+        if len(data) < BIF_HEADER_SIZE or data[:8] != BIF_MAGIC:
+            raise BifError('Not a BIF file')
+
+        version, count, interval = struct.unpack('<III', data[8:20])
+        if version != 0:
+            raise BifError('Unsupported BIF version: {0}'.format(version))
+
+        self.count = count
+        self.interval = interval or BIF_DEFAULT_INTERVAL
+
+        tableEnd = BIF_HEADER_SIZE + (count + 1) * 8
+        if len(data) < tableEnd:
+            raise BifError('Truncated BIF index')
+
+        # The table has one more entry than there are frames, its offset marks the end of the last one
+        table = struct.unpack('<{0}I'.format((count + 1) * 2), data[BIF_HEADER_SIZE:tableEnd])
+        self.offsets = table[1::2]
+        if self.offsets[-1] > len(data):
+            raise BifError('Truncated BIF frames')
+
+    def frameIndex(self, offset):
+        """
+        Index of the frame shown at offset (ms into the part).
+        """
+        return max(0, min(self.count - 1, offset // self.interval))
+
+    def frame(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def close(self):
+        data, self.data = getattr(self, 'data', None), None
+        if isinstance(data, mmap.mmap):
+            data.close()
+        self.file.close()
+
+
+class BifPart(object):
+    def __init__(self, startOffset, duration, url):
+        self.startOffset = startOffset
+        self.duration = duration
+        self.url = url
+        self.name = hashlib.sha1(url.split('?')[0].encode('utf-8')).hexdigest()[:16]
+        self.index = None
+        self.request = None
+
+
+class BifCache(object):
+    """
+    Seek previews served from local files instead of one server request per seek position.
+
+    The BIF index of every part is downloaded once in the background and memory mapped. Frames are
+    sliced out of it into a small LRU of JPEG files in folder, keyed by part and frame index, and the
+    next frames in the seek direction are extracted ahead of time. Until a part's index is there,
+    getFrame() returns None, so the caller can fall back to the server's per-offset images.
+
+    parts are (startOffset, duration, url) tuples, as returned by PlexVideoPlayer.getBifIndexes().
+    """
+
+    def __init__(self, parts, folder):
+        self.parts = [BifPart(*p) for p in parts]
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.frames = OrderedDict()  # (part name, frame index): path, least recently used first
+        self.prefetchEvent = threading.Event()
+        self.prefetchQueue = []
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+
+        self._clearFolder()
+        self.thread = threading.Thread(target=self._run, name='BIF')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _clearFolder(self):
+        # Leftovers of an earlier session (the folder only ever holds the current video's frames)
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder, ignore_errors=True)
+
+        try:
+            os.makedirs(self.folder)
+        except OSError:
+            if not os.path.isdir(self.folder):
+                raise
+
+    def isFor(self, parts):
+        return [p[2].split('?')[0] for p in parts] == [p.url.split('?')[0] for p in self.parts]
+
+    def _partFor(self, offset):
+        for part in self.parts:
+            if part.startOffset <= offset < part.startOffset + part.duration:
+                return part
+        return None
+
+    def isReady(self, offset=0):
+        part = self._partFor(offset)
+        return bool(part and part.index)
+
+    def getFrame(self, offset, direction=0):
+        """
+        Path of the preview image for offset (ms), or None if it isn't available locally (yet).
+        direction (<0 backwards, >0 forwards) decides which frames are prefetched.
+        """
+        part = self._partFor(offset)
+        if not part or not part.index or self.closed:
+            return None
+
+        index = part.index.frameIndex(offset - part.startOffset)
+        path = self._extract(part, index)
+        if path is None:
+            return None
+
+        if direction:
+            step = direction > 0 and 1 or -1
+            with self.lock:
+                self.prefetchQueue = [
+                    (part, i) for i in range(index + step, index + step * (BIF_PREFETCH + 1), step) if 0 <= i < part.index.count
+                ]
+            self.prefetchEvent.set()
+
+        return path
+
+    def _extract(self, part, index, prefetch=False):
+        # Frames are small, writing one under the lock is cheaper than sorting out concurrent writers
+        key = (part.name, index)
+        with self.lock:
+            path = self.frames.get(key)
+            if path:
+                self.frames[key] = self.frames.pop(key)
+                if not prefetch:
+                    self.hits += 1
+                return path
+
+            if self.closed or not part.index:
+                return None
+
+            if not prefetch:
+                self.misses += 1
+
+            # Names are unique per part, so Kodi never shows a texture it cached for another video
+            path = os.path.join(self.folder, '{0}-{1}.jpg'.format(*key))
+            try:
+                with open(path, 'wb') as f:
+                    f.write(part.index.frame(index))
+            except EnvironmentError:
+                util.ERROR()
+                return None
+
+            self.frames[key] = path
+            while len(self.frames) > BIF_FRAME_CACHE_SIZE:
+                self._remove(self.frames.popitem(last=False)[1])
+
+        return path
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _run(self):
+        for part in self.parts:
+            if self.closed:
+                return
+            self._download(part)
+
+        while not self.closed:
+            self.prefetchEvent.wait()
+            self.prefetchEvent.clear()
+            while not self.closed:
+                with self.lock:
+                    if not self.prefetchQueue:
+                        break
+                    part, index = self.prefetchQueue.pop(0)
+                self._extract(part, index, prefetch=True)
+
+    def _download(self, part):
+        start = time.time()
+        path = os.path.join(self.folder, part.name + '.bif')
+        tmpPath = path + '.part'
+        part.request = http.HttpRequest(part.url)
+        try:
+            response = part.request.getPostWithTimeout(http.DEFAULT_TIMEOUT)
+            if response is None or part.request._cancel:
+                return
+
+            try:
+                if not response.ok:
+                    util.DEBUG_LOG('BIF: Download failed ({0})'.format(response.status_code))
+                    return
+
+                with open(tmpPath, 'wb') as f:
+                    for chunk in response.iter_content(BIF_CHUNK_SIZE):
+                        if part.request._cancel:
+                            return
+                        f.write(chunk)
+            finally:
+                response.close()
+
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmpPath, path)
+
+            index = BifIndex(path)
+            with self.lock:
+                if self.closed:
+                    index.close()
+                    return
+                part.index = index
+
+            util.DEBUG_LOG('BIF: Loaded {0} frames every {1}ms ({2} bytes) in {3:.2f}s'.format(
+                index.count, index.interval, os.path.getsize(path), time.time() - start
+            ))
+        except Exception:
+            if not part.request._cancel:
+                util.ERROR()
+        finally:
+            part.request = None
+            self._remove(tmpPath)
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.prefetchQueue = []
+            self.frames = OrderedDict()  # the files go with the folder below
+
+        self.prefetchEvent.set()
+        for part in self.parts:
+            request = part.request
+            if request:
+                request.cancel()
+
+        self.thread.join(2)
+        with self.lock:
+            for part in self.parts:
+                index, part.index = part.index, None
+                if index:
+                    index.close()
+
+        util.DEBUG_LOG('BIF: {0} previews from the frame cache, {1} extracted on demand'.format(self.hits, self.misses))
+        shutil.rmtree(self.folder, ignore_errors=True)
@@ -1,5 +1,4 @@
 from __future__ import absolute_import
-import threading
 
 
 class Callable(object):
@@ -46,9 +45,8 @@ class Callable(object):
         return cls._currID
 
     def deferCall(self, timeout=0.1):
-        timer = threading.Timer(timeout, self.onDeferCallTimer)
-        timer.name = 'ONDEFERCALLBACK-TIMER:{0}'.format(self.func)
-        timer.start()
+        from . import util
+        util.TIMER(timeout, self.onDeferCallTimer)
 
     def onDeferCallTimer(self):
         self()
@@ -3,19 +3,27 @@ import threading
 import socket
 import traceback
 import time
+import selectors
 from . import util
 from . import netif
 
 from . import plexconnection
 
 DISCOVERY_PORT = 32414
+DISCOVERY_TIMEOUT = 5
+SEARCH_ATTEMPTS = 3
+SEARCH_RETRY_DELAY = 0.5  # doubles after every M-SEARCH
 WIN_NL = chr(13) + chr(10)
 
 
 class GDMDiscovery(object):
     def __init__(self):
         self._close = False
+        self._wakeR = self._wakeW = None
         self.thread = None
+        self.servers = []
+        self.answered = set()
+        self.known = set()
 
     # def isActive(self):
     #     util.LOG('GDMDiscovery().isActive() - NOT IMPLEMENTED')
@@ -125,6 +133,7 @@ class GDMDiscovery(object):
         if not util.INTERFACE.getPreference("gdm_discovery", True) or self.isActive():
             return
 
+        self._close = False
         self.thread = threading.Thread(target=self._discover)
         self.thread.start()
 
@@ -132,49 +141,106 @@ class GDMDiscovery(object):
         ifaces = netif.getInterfaces()
         sockets = []
         self.servers = []
+        self.answered = set()
+        self.known = self.getKnownServers()
 
         packet = ("M-SEARCH * HTTP/1.1" + WIN_NL + WIN_NL).encode("utf-8")
 
-        for i in ifaces:
-            if not i.broadcast:
-                continue
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.settimeout(0.01)  # 10ms
-            s.bind((i.ip, 0))
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sockets.append((s, i))
+        selector = selectors.DefaultSelector()
+        self._wakeR, self._wakeW = socket.socketpair()
+        selector.register(self._wakeR, selectors.EVENT_READ)
 
-        success = False
-
-        for attempt in (0, 1):
-            for s, i in sockets:
-                if self._close:
-                    return
-                util.DEBUG_LOG('  o-> Broadcasting to {0}: {1}'.format(i.name, i.broadcast))
+        try:
+            for i in ifaces:
+                if not i.broadcast:
+                    continue
                 try:
-                    s.sendto(packet, (i.broadcast, DISCOVERY_PORT))
-                    success = True
+                    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    s.setblocking(False)
+                    s.bind((i.ip, 0))
+                    s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
                 except:
                     util.ERROR()
+                    continue
+                sockets.append((s, i))
+                selector.register(s, selectors.EVENT_READ)
+
+            start = time.time()
+            end = start + DISCOVERY_TIMEOUT
+            nextSearch = start
+            searches = 0
+
+            while not self._close:
+                now = time.time()
+                if now >= end:
+                    break
+
+                if searches < SEARCH_ATTEMPTS and now >= nextSearch:
+                    self.search(sockets, packet)
+                    nextSearch = now + SEARCH_RETRY_DELAY * (2 ** searches)
+                    searches += 1
+
+                wait = end - now
+                if searches < SEARCH_ATTEMPTS:
+                    wait = min(wait, nextSearch - now)
+
+                for key, mask in selector.select(max(wait, 0)):
+                    if key.fileobj is self._wakeR:
+                        continue
+
+                    self.receive(key.fileobj)
+
+                if self.known and self.known <= self.answered:
+                    util.LOG("GDM: All {0} known server(s) answered after {1:.2f}s".format(len(self.known), time.time() - start))
+                    break
+        finally:
+            selector.close()
+            for s, i in sockets:
+                s.close()
+            self._wakeR.close()
+            self._wakeW.close()
+            self._wakeR = self._wakeW = None
 
-            if success:
-                break
+        if self._close:
+            return
+
+        self.discoveryFinished()
 
-        end = time.time() + 5
+    def search(self, sockets, packet):
+        for s, i in sockets:
+            util.DEBUG_LOG('  o-> Broadcasting to {0}: {1}'.format(i.name, i.broadcast))
+            try:
+                s.sendto(packet, (i.broadcast, DISCOVERY_PORT))
+            except:
+                util.ERROR()
+
+    def receive(self, sock):
+        while True:
+            try:
+                message, address = sock.recvfrom(4096)
+            except (socket.error, OSError):
+                return
+
+            try:
+                self.onSocketEvent(message, address)
+            except:
+                traceback.print_exc()
+
+    def getKnownServers(self):
+        # Servers we've previously discovered on the local network. Once they have all answered there's
+        # no point in waiting out the full discovery window.
+        from . import plexapp
+        if not plexapp.SERVERMANAGER:
+            return set()
 
-        while time.time() < end:
-            for s, i in sockets:
-                if self._close:
-                    return
-                try:
-                    message, address = s.recvfrom(4096)
-                    self.onSocketEvent(message, address)
-                except socket.timeout:
-                    pass
-                except:
-                    traceback.print_exc()
+        known = set()
+        for server in plexapp.SERVERMANAGER.getServers():
+            for conn in server.connections:
+                if conn.sources & plexconnection.PlexConnection.SOURCE_DISCOVERED:
+                    known.add(server.uuid)
+                    break
 
-        self.discoveryFinished()
+        return known
 
     def onSocketEvent(self, message, addr):
         util.DEBUG_LOG('Received GDM message:\n' + str(message))
@@ -182,7 +248,7 @@ class GDMDiscovery(object):
         hostname = addr[0]  # socket.gethostbyaddr(addr[0])[0]
 
         name = parseFieldValue(message, b"Name: ")
-        port = parseFieldValue(message, b"Port: ") or b"32400"
+        port = parseFieldValue(message, b"Port: ") or "32400"
         machineID = parseFieldValue(message, b"Resource-Identifier: ")
         secureHost = parseFieldValue(message, b"Host: ")
 
@@ -191,6 +257,10 @@ class GDMDiscovery(object):
         if not name or not machineID:
             return
 
+        # Every search retry and every interface can produce an answer from the same server
+        if machineID in self.answered:
+            return
+
         from . import plexserver
         conn = plexconnection.PlexConnection(plexconnection.PlexConnection.SOURCE_DISCOVERED, "http://" + hostname + ":" + port, True, None, bool(secureHost))
         server = plexserver.createPlexServerForConnection(conn)
@@ -209,8 +279,13 @@ class GDMDiscovery(object):
                 )
             )
 
+        self.answered.add(machineID)
         self.servers.append(server)
 
+        # Publish right away so reachability tests don't have to wait for the discovery window to close
+        from . import plexapp
+        plexapp.SERVERMANAGER.updateFromDiscovery(server)
+
     def discoveryFinished(self, *args, **kwargs):
         # Time's up, report whatever we found
         self.close()
@@ -223,6 +298,12 @@ class GDMDiscovery(object):
 
     def close(self):
         self._close = True
+        wake = self._wakeW
+        if wake:
+            try:
+                wake.send(b'x')
+            except (socket.error, OSError):
+                pass
 
 
 def parseFieldValue(message, label):
@@ -23,14 +23,15 @@ status_codes = requests.status_codes._codes
 
 
 DEFAULT_TIMEOUT = asyncadapter.AsyncTimeout(10).setConnectTimeout(10)
+XML_CHUNK_SIZE = 64 * 1024
 
 
 def GET(*args, **kwargs):
-    return requests.get(*args, headers=util.BASE_HEADERS.copy(), timeout=util.TIMEOUT, **kwargs)
+    return Session().get(*args, timeout=util.TIMEOUT, **kwargs)
 
 
 def POST(*args, **kwargs):
-    return requests.post(*args, headers=util.BASE_HEADERS.copy(), timeout=util.TIMEOUT, **kwargs)
+    return Session().post(*args, timeout=util.TIMEOUT, **kwargs)
 
 
 def Session():
@@ -172,7 +173,7 @@ class HttpRequest(object):
         except Exception as e:
             info = traceback.extract_tb(sys.exc_info()[2])[-1]
             util.WARN_LOG(
-                "Request errored out - URL: {0} File: {1} Line: {2} Msg: {3}".format(util.cleanToken(self.url), os.path.basename(info[0]), info[1], e.message)
+                "Request errored out - URL: {0} File: {1} Line: {2} Msg: {3}".format(util.cleanToken(self.url), os.path.basename(info[0]), info[1], e)
             )
 
         return None
@@ -282,7 +283,7 @@ class HttpResponse(object):
     def getBodyString(self):
         if self.event is None:
             return ''
-        return self.event.text.encode('utf-8')
+        return self.event.content
 
     def getErrorString(self):
         if self.event is None:
@@ -304,16 +305,70 @@ class HttpResponse(object):
 class HttpObjectResponse(HttpResponse, plexobjects.PlexContainer):
     def __init__(self, response, path, server=None):
         self.event = response
-        if self.event:
-            self.event.content  # force data to be read
-            self.event.close()
 
-        data = self.getBodyXml()
+        # Stream the body: the container comes first, the items are built as they're parsed
+        elems = iterXml(self.event) if self.event is not None else iter(())
+        data = next(elems, None)
 
         plexobjects.PlexContainer.__init__(self, data, initpath=path, server=server, address=path)
         self.container = self
 
-        self.items = plexobjects.listItems(server, path, data=data, container=self)
+        self.items = plexobjects.listItems(server, path, data=elems, container=self)
+
+
+def parseXml(response, body=None):
+    """
+    Parse a response body into an Element, feeding the parser chunk by chunk
+    instead of building decoded/re-encoded copies of the whole body first.
+    Returns None for an empty body. If a body list is passed, the raw chunks
+    are collected into it as well.
+    """
+    parser = ElementTree.XMLParser()
+    empty = True
+    for chunk in response.iter_content(XML_CHUNK_SIZE):
+        if chunk:
+            empty = False
+            parser.feed(chunk)
+            if body is not None:
+                body.append(chunk)
+
+    if empty:
+        return None
+
+    return parser.close()
+
+
+def iterXml(response):
+    """
+    Incrementally parse a response body. Yields the root element first (with
+    its attributes, but no children yet) and then each of its direct children
+    as soon as it's complete. Children are detached from the root once they've
+    been handed out, so memory scales with a single item rather than the whole
+    document. The response is closed when the generator finishes.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    root = None
+    depth = 0
+    try:
+        for chunk in response.iter_content(XML_CHUNK_SIZE):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                        yield root
+                    continue
+
+                depth -= 1
+                if depth == 1:
+                    yield elem
+                    root.remove(elem)
+
+        if root is not None:
+            parser.close()
+    finally:
+        response.close()
 
 
 def addRequestHeaders(transferObj, headers=None):
@@ -0,0 +1,119 @@
+from __future__ import absolute_import
+import threading
+from collections import OrderedDict
+
+from . import util
+
+BATCH_WINDOW = 0.05  # seconds to collect concurrent reloads before querying
+BATCH_MAX_KEYS = 50  # rating keys per /library/metadata/<id1>,<id2>,... request
+
+
+def reloadItems(items, _soft=False, **kwargs):
+    """
+    Reloads items with one /library/metadata/<id1>,<id2>,... query per server instead of one query per item.
+    _soft and kwargs behave as with PlexObject.reload().
+    """
+    groups = OrderedDict()
+    for item in items:
+        if _soft and item._reloaded:
+            continue
+
+        if not item.get('ratingKey'):
+            item.reload(_soft=_soft, **kwargs)
+            continue
+
+        groups.setdefault(id(item.server), []).append(item)
+
+    for group in groups.values():
+        for i in range(0, len(group), BATCH_MAX_KEYS):
+            _reloadGroup(group[i:i + BATCH_MAX_KEYS], kwargs, _soft)
+
+    return items
+
+
+def _reloadGroup(items, params, soft=False):
+    params = dict(params)
+    params["includeMarkers"] = 1
+
+    keys = list(OrderedDict.fromkeys(str(item.ratingKey) for item in items))
+    server = items[0].server
+    try:
+        data = server.query('/library/metadata/{0}'.format(','.join(keys)), params=params)
+    except Exception as e:
+        util.ERROR(err=e)
+        data = None
+
+    if data is None:
+        for item in items:
+            item.initpath = item.key
+        return
+
+    util.DEBUG_LOG('Reloaded {0} items with one request'.format(len(keys)))
+
+    elements = {}
+    for elem in data:
+        elements.setdefault(elem.attrib.get('ratingKey'), elem)
+
+    for item in items:
+        item._reloaded = True
+        item.initpath = item.key
+
+        elem = elements.get(str(item.ratingKey))
+        if elem is None:
+            util.DEBUG_LOG('No data on reload: {0}'.format(item))
+            continue
+
+        if not soft:
+            item._prepareReload()
+        item._setData(elem)
+
+
+class ReloadBatch(object):
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class ReloadBatcher(object):
+    """
+    Collects PlexObject.reload(_batch=True) calls made from any thread within BATCH_WINDOW and runs them as one
+    reloadItems() call per server and set of parameters. Callers block until their batch has been reloaded.
+    """
+
+    def __init__(self, window=BATCH_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def reload(self, item, params, soft=False):
+        key = (id(item.server), soft, repr(sorted(params.items())))
+        with self.lock:
+            batch = self.pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self.pending[key] = ReloadBatch()
+
+            batch.items.append(item)
+            if len(batch.items) >= BATCH_MAX_KEYS:
+                del self.pending[key]
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+            return item
+
+        batch.full.wait(self.window)
+        with self.lock:
+            if self.pending.get(key) is batch:
+                del self.pending[key]
+
+        try:
+            reloadItems(batch.items, _soft=soft, **params)
+        finally:
+            batch.done.set()
+
+        return item
+
+
+BATCHER = ReloadBatcher()
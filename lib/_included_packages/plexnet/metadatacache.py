@@ -0,0 +1,309 @@
+from __future__ import absolute_import
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from . import util
+
+INDEX_FILE = 'index.json'
+CACHE_MAX_SIZE = 64 * 1024 * 1024  # bytes on disk before least recently used entries are dropped
+CACHE_MAX_STALE = 7 * 86400  # stale entries older than this aren't served, not even while revalidating
+CACHE_SAVE_DELAY = 30  # seconds between a change and writing the index, so bursts of responses share one write
+
+# (class, matcher, ttl in seconds) - the first match wins, paths not matching anything aren't cached
+PATH_CLASSES = (
+    ('sections', re.compile(r'^/library/sections/?(\?|$)'), 3600),
+    ('metadata', re.compile(r'^/library/metadata/\d+'), 600),
+    ('sectionHubs', re.compile(r'^/hubs/sections/\d+'), 300),
+    ('hubs', re.compile(r'^/hubs/?(\?|$)|^/hubs/(?!search)'), 120),
+)
+
+# Classes that can change whenever an item's watch state changes
+WATCH_STATE_CLASSES = ('metadata', 'sectionHubs', 'hubs')
+
+ITEM_PATH = re.compile(r'^/library/metadata/([\d,]+)/?(\?|$)')
+
+
+class MetadataCache(object):
+    """
+    Opt-in on-disk cache for PlexServer.query() responses.
+
+    Entries are keyed by the active (home) user, the server uuid and the request path (which never
+    carries the token) and expire per path class. Expired entries are still handed out for a while, so
+    windows can render right away while the server revalidates them in the background; if the server
+    sent something new, the app triggers "metadata:updated" (server, path) for windows to query again.
+    The total size is capped, dropping the least recently used entries first.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.path = None
+        self.index = None
+        self.size = 0
+        self._dirty = False
+        self._saveTimer = None
+        self._revalidating = set()
+        self.hits = 0
+        self.misses = 0
+
+    def isEnabled(self):
+        return bool(util.INTERFACE.getPreference('metadata_cache', False) and util.INTERFACE.getGlobal('metadataCachePath'))
+
+    def pathClass(self, path):
+        for name, matcher, ttl in PATH_CLASSES:
+            if matcher.search(path):
+                return name, ttl
+
+        return None, None
+
+    def accepts(self, path):
+        return self.isEnabled() and self.pathClass(path)[0] is not None
+
+    def _load(self):
+        if self.index is not None:
+            return
+
+        self.path = util.INTERFACE.getGlobal('metadataCachePath')
+        self.index = OrderedDict()
+        self.size = 0
+
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+
+            indexPath = os.path.join(self.path, INDEX_FILE)
+            if os.path.exists(indexPath):
+                with open(indexPath, 'r') as f:
+                    for key, entry in json.load(f):
+                        if os.path.exists(self._filePath(key)):
+                            self.index[key] = entry
+                            self.size += entry['size']
+        except Exception:
+            util.ERROR('Failed to load metadata cache index')
+            self.index = OrderedDict()
+            self.size = 0
+
+    def _filePath(self, key):
+        return os.path.join(self.path, key + '.xml')
+
+    def _userId(self):
+        # Servers answer with the signed in user's libraries and watch state, home users must not share entries
+        from . import myplexaccount
+        return myplexaccount.ACCOUNT.ID or ''
+
+    def _key(self, uuid, path):
+        return hashlib.sha1('{0}\0{1}\0{2}'.format(self._userId(), uuid, path).encode('utf-8')).hexdigest()
+
+    def get(self, uuid, path):
+        """
+        Returns (body, fresh) for a cached response or None.
+        """
+        if not self.isEnabled():
+            return None
+
+        with self.lock:
+            self._load()
+            key = self._key(uuid, path)
+            entry = self.index.get(key)
+            if not entry:
+                self.misses += 1
+                return None
+
+            age = time.time() - entry['stored']
+            if age > CACHE_MAX_STALE:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            try:
+                with open(self._filePath(key), 'rb') as f:
+                    body = f.read()
+            except (IOError, OSError):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            # Most recently used entries live at the end
+            self.index.pop(key)
+            self.index[key] = entry
+            self.hits += 1
+
+            return body, age <= entry['ttl']
+
+    def getValidators(self, uuid, path):
+        with self.lock:
+            self._load()
+            entry = self.index.get(self._key(uuid, path))
+            if not entry:
+                return {}
+
+            headers = {}
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('modified'):
+                headers['If-Modified-Since'] = entry['modified']
+            return headers
+
+    def put(self, uuid, path, body, headers=None):
+        if not body or not self.isEnabled():
+            return
+
+        cls, ttl = self.pathClass(path.split('#', 1)[0])
+        if not cls:
+            return
+
+        headers = headers or {}
+        with self.lock:
+            self._load()
+            key = self._key(uuid, path)
+            try:
+                with open(self._filePath(key), 'wb') as f:
+                    f.write(body)
+            except (IOError, OSError):
+                util.ERROR('Failed to write metadata cache entry')
+                return
+
+            old = self.index.pop(key, None)
+            if old:
+                self.size -= old['size']
+
+            self.index[key] = {
+                'server': uuid,
+                'path': path,
+                'class': cls,
+                'ttl': ttl,
+                'size': len(body),
+                'stored': time.time(),
+                'etag': headers.get('ETag'),
+                'modified': headers.get('Last-Modified')
+            }
+            self.size += len(body)
+
+            while self.size > CACHE_MAX_SIZE and len(self.index) > 1:
+                self._remove(next(iter(self.index)))
+
+            self._scheduleSave()
+
+    def touch(self, uuid, path):
+        # The server confirmed our copy is still current
+        with self.lock:
+            self._load()
+            entry = self.index.get(self._key(uuid, path))
+            if entry:
+                entry['stored'] = time.time()
+                self._scheduleSave()
+
+    def startRevalidation(self, uuid, path):
+        """
+        Returns True if the caller should revalidate the entry, False if that's already happening.
+        """
+        with self.lock:
+            key = self._key(uuid, path)
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            return True
+
+    def finishRevalidation(self, uuid, path):
+        with self.lock:
+            self._revalidating.discard(self._key(uuid, path))
+
+    def _remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            self.size -= entry['size']
+            self._dirty = True
+
+        try:
+            os.remove(self._filePath(key))
+        except (IOError, OSError):
+            pass
+
+    def invalidate(self, uuid=None, classes=None, match=None):
+        if not self.isEnabled():
+            return
+
+        with self.lock:
+            self._load()
+            drop = [
+                key for key, entry in self.index.items()
+                if (uuid is None or entry['server'] == uuid) and
+                   (classes is None or entry['class'] in classes) and
+                   (match is None or match(entry['path']))
+            ]
+
+            if not drop:
+                return
+
+            util.DEBUG_LOG('Metadata cache: Invalidating {0} entries'.format(len(drop)))
+            for key in drop:
+                self._remove(key)
+
+            self._scheduleSave()
+
+    def invalidateItem(self, uuid, ratingKey):
+        """
+        Drops the item's own metadata as well as the hubs it may be listed in (On Deck, Continue Watching, ...).
+        """
+        if not ratingKey:
+            return self.invalidate(uuid, WATCH_STATE_CLASSES)
+
+        # Batched reloads ask for several keys at once (/library/metadata/1,2,3)
+        itemPath = re.compile(r'^/library/metadata/(\d+,)*{0}(\D|$)'.format(re.escape(str(ratingKey))))
+        self.invalidate(uuid, WATCH_STATE_CLASSES, lambda path: not path.startswith('/library/metadata/') or itemPath.search(path))
+
+    def onWatchStatusChanged(self, **kwargs):
+        # We don't know which item changed, so everything watch state related has to go
+        self.invalidate(classes=WATCH_STATE_CLASSES)
+
+    def _scheduleSave(self):
+        # Losing a pending write only forgets the newest entries, the index skips files that are gone
+        self._dirty = True
+        if not self._saveTimer or self._saveTimer.isExpired():
+            self._saveTimer = util.Timer(CACHE_SAVE_DELAY, self.save)
+
+    def save(self):
+        with self.lock:
+            timer, self._saveTimer = self._saveTimer, None
+            if timer:
+                timer.cancel()
+
+            if not self._dirty or self.index is None:
+                return
+
+            indexPath = os.path.join(self.path, INDEX_FILE)
+            try:
+                with open(indexPath + '.tmp', 'w') as f:
+                    json.dump(list(self.index.items()), f)
+
+                if os.name == 'nt' and os.path.exists(indexPath):
+                    os.remove(indexPath)
+                os.rename(indexPath + '.tmp', indexPath)
+                self._dirty = False
+            except (IOError, OSError):
+                util.ERROR('Failed to save metadata cache index')
+
+    def getStats(self):
+        with self.lock:
+            return {
+                'entries': self.index is not None and len(self.index) or 0,
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def itemKeys(path):
+    """
+    The ratingKeys of the items whose own metadata a path asks for (/library/metadata/<key>[,<key>...]),
+    an empty set for any other path.
+    """
+    match = ITEM_PATH.search(path)
+    return match and set(match.group(1).split(',')) or set()
+
+
+CACHE = MetadataCache()
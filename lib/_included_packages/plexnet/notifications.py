@@ -0,0 +1,341 @@
+from __future__ import absolute_import
+import os
+import ssl
+import json
+import base64
+import socket
+import struct
+import hashlib
+import threading
+
+import requests
+import six
+from six.moves.urllib.parse import urlsplit
+
+from . import util
+from . import signalsmixin
+
+NOTIFICATIONS_PATH = '/:/websockets/notifications'
+CONNECT_TIMEOUT = 10  # seconds for connecting and the websocket handshake
+PING_INTERVAL = 30  # seconds of silence before we ping the server; no answer within another interval drops the socket
+RECONNECT_MIN_DELAY = 2  # seconds before the first reconnect attempt, doubled on every failure
+RECONNECT_MAX_DELAY = 120
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC11B85'
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    pass
+
+
+class WebSocket(object):
+    """
+    Minimal RFC 6455 client - just enough to follow a server's notification stream: text messages,
+    fragmentation, ping/pong and close. ws(s):// and http(s):// urls are both accepted.
+    """
+
+    def __init__(self, url, headers=None, timeout=CONNECT_TIMEOUT):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b''
+
+    def connect(self):
+        parts = urlsplit(self.url)
+        secure = parts.scheme in ('wss', 'https')
+        host = parts.hostname
+        port = parts.port or (secure and 443 or 80)
+
+        sock = socket.create_connection((host, port), self.timeout)
+        try:
+            if secure:
+                context = ssl.create_default_context(cafile=requests.certs.where())
+                sock = context.wrap_socket(sock, server_hostname=host)
+
+            self.sock = sock
+            self._handshake(parts, host, port)
+        except Exception:
+            self.sock = None
+            sock.close()
+            raise
+
+        return self
+
+    def _handshake(self, parts, host, port):
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        lines = [
+            'GET {0} HTTP/1.1'.format(path),
+            'Host: {0}:{1}'.format(host, port),
+            'Upgrade: websocket',
+            'Connection: Upgrade',
+            'Sec-WebSocket-Key: {0}'.format(key),
+            'Sec-WebSocket-Version: 13'
+        ]
+        lines += ['{0}: {1}'.format(k, v) for k, v in self.headers.items()]
+        self.sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+
+        while b'\r\n\r\n' not in self.buffer:
+            self._fill()
+            if len(self.buffer) > 65536:
+                raise WebSocketError('Handshake response too large')
+
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        head = head.decode('latin-1').split('\r\n')
+        status = head[0].split(' ')
+        if len(status) < 2 or status[1] != '101':
+            raise WebSocketError('Handshake failed: {0}'.format(head[0]))
+
+        headers = dict((k.strip().lower(), v.strip()) for k, v in (h.split(':', 1) for h in head[1:] if ':' in h))
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode('ascii')).digest()).decode('ascii')
+        if headers.get('sec-websocket-accept') != accept:
+            raise WebSocketError('Handshake failed: Bad Sec-WebSocket-Accept')
+
+    def _fill(self):
+        data = self.sock.recv(16384)
+        if not data:
+            raise WebSocketError('Connection closed')
+        self.buffer += data
+
+    def _read(self, size):
+        while len(self.buffer) < size:
+            self._fill()
+
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _readFrame(self):
+        head = bytearray(self._read(2))
+        fin = head[0] & 0x80
+        opcode = head[0] & 0x0F
+        masked = head[1] & 0x80
+        length = head[1] & 0x7F
+
+        if length == 126:
+            length = struct.unpack('!H', self._read(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._read(8))[0]
+
+        mask = masked and bytearray(self._read(4)) or None
+        payload = self._read(length)
+        if mask:
+            payload = bytes(bytearray(b ^ mask[i % 4] for i, b in enumerate(bytearray(payload))))
+
+        return fin, opcode, payload
+
+    def send(self, payload=b'', opcode=OP_TEXT):
+        if isinstance(payload, six.text_type):
+            payload = payload.encode('utf-8')
+
+        length = len(payload)
+        if length < 126:
+            head = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            head = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            head = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+
+        # Client frames always have to be masked
+        mask = bytearray(os.urandom(4))
+        masked = bytes(bytearray(b ^ mask[i % 4] for i, b in enumerate(bytearray(payload))))
+        self.sock.sendall(head + bytes(mask) + masked)
+
+    def ping(self):
+        self.send(b'', OP_PING)
+
+    def recv(self, timeout=None):
+        """
+        Returns the next text message, an empty string for a pong, or None when nothing arrived within timeout.
+        """
+        fragments = []
+        while True:
+            if not self.buffer and not fragments:
+                self.sock.settimeout(timeout)
+                try:
+                    self._fill()
+                except socket.timeout:
+                    return None
+
+            # Once a frame started arriving, the rest of it has to follow promptly
+            self.sock.settimeout(self.timeout)
+            fin, opcode, payload = self._readFrame()
+
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+            elif opcode == OP_PONG:
+                return ''
+            elif opcode == OP_CLOSE:
+                try:
+                    self.send(payload[:2], OP_CLOSE)
+                except Exception:
+                    pass
+                raise WebSocketError('Closed by server')
+            else:
+                fragments.append(payload)
+                if fin:
+                    return b''.join(fragments).decode('utf-8')
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if not sock:
+            return
+
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        sock.close()
+
+
+class NotificationListener(signalsmixin.SignalsMixin):
+    """
+    Follows a server's notification websocket on a background thread and emits:
+
+        timeline(server, entries)        - items added, changed or deleted
+        activity(server, activities)     - server activities (library scans, ...) starting, progressing and ending
+        playing(server, sessions)        - playback sessions changing state
+        connected(server)/disconnected(server)
+
+    Dropped connections are retried with an increasing delay, isConnected() tells whether updates are
+    currently coming in, so callers can fall back to polling while they aren't.
+    """
+
+    def __init__(self):
+        signalsmixin.SignalsMixin.__init__(self)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+        self.ws = None
+        self.connected = False
+        self._stop = None
+        self.messages = 0
+        self.reconnects = 0
+
+    def start(self, server):
+        with self.lock:
+            if server is self.server and self.thread and self.thread.is_alive():
+                return
+
+        self.stop()
+
+        with self.lock:
+            self.server = server
+            self._stop = threading.Event()
+            self.thread = threading.Thread(target=self._run, args=(server, self._stop), name='NOTIFICATIONS')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            if not self._stop:
+                return
+
+            util.DEBUG_LOG('Notifications: Stopping ({0} messages, {1} reconnects)'.format(self.messages, self.reconnects))
+            self._stop.set()
+            self._stop = None
+            self.server = None
+            self.connected = False
+            ws, self.ws = self.ws, None
+
+        if ws:
+            ws.close()
+
+    def isConnected(self):
+        return self.connected
+
+    def _connect(self, server, stop):
+        url = server.buildUrl(NOTIFICATIONS_PATH, includeToken=True)
+        if not url:
+            raise WebSocketError('No connection')
+
+        headers = dict((k, v) for k, v in util.BASE_HEADERS.items() if k != 'Accept-Encoding')
+        ws = WebSocket(url, headers=headers).connect()
+        with self.lock:
+            if stop.is_set():
+                ws.close()
+                return None
+            self.ws = ws
+            self.connected = True
+
+        return ws
+
+    def _run(self, server, stop):
+        delay = RECONNECT_MIN_DELAY
+        while not stop.is_set():
+            ws = None
+            try:
+                ws = self._connect(server, stop)
+                if not ws:
+                    return
+
+                util.DEBUG_LOG('Notifications: Connected to {0}'.format(server.name))
+                self.trigger('connected', server=server)
+                delay = RECONNECT_MIN_DELAY
+
+                pinged = False
+                while not stop.is_set():
+                    message = ws.recv(PING_INTERVAL)
+                    if message is None:
+                        if pinged:
+                            raise WebSocketError('No answer to ping')
+                        ws.ping()
+                        pinged = True
+                        continue
+
+                    pinged = False
+                    if message:
+                        self._dispatch(server, message)
+            except Exception as e:
+                if stop.is_set():
+                    return
+                util.DEBUG_LOG('Notifications: Connection to {0} failed: {1}'.format(server.name, e))
+            finally:
+                if ws:
+                    ws.close()
+
+            with self.lock:
+                if stop.is_set():
+                    return
+                if self.connected:
+                    self.connected = False
+                    self.ws = None
+                    disconnected = True
+                else:
+                    disconnected = False
+
+            if disconnected:
+                self.trigger('disconnected', server=server)
+
+            self.reconnects += 1
+            stop.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _dispatch(self, server, message):
+        self.messages += 1
+        try:
+            container = json.loads(message).get('NotificationContainer') or {}
+        except ValueError:
+            util.DEBUG_LOG('Notifications: Ignoring invalid message')
+            return
+
+        ntype = container.get('type')
+        try:
+            if ntype == 'timeline':
+                self.trigger('timeline', server=server, entries=container.get('TimelineEntry') or [])
+            elif ntype == 'activity':
+                self.trigger('activity', server=server, activities=container.get('ActivityNotification') or [])
+            elif ntype == 'playing':
+                self.trigger('playing', server=server, sessions=container.get('PlaySessionStateNotification') or [])
+        except Exception:
+            util.ERROR()
@@ -10,6 +10,7 @@ import six.moves.urllib.parse
 from . import plexrequest
 from . import callback
 from . import http
+from . import metadatacache
 
 
 class ServerTimeline(util.AttributeDict):
@@ -188,6 +189,9 @@ class NowPlayingManager(object):
             if params[paramKey]:
                 path = http.addUrlParam(path, paramKey + "=" + six.moves.urllib.parse.quote(str(params[paramKey])))
 
+        # Progress and watch state of the item (and the hubs listing it) are about to change on the server
+        metadatacache.CACHE.invalidateItem(timeline.item.getServer().uuid, timeline.item.ratingKey)
+
         request = plexrequest.PlexRequest(timeline.item.getServer(), path)
 
         context = request.createRequestContext("timelineUpdate", callback.Callable(self.onTimelineResponse))
@@ -92,7 +92,8 @@ class App(signalsmixin.SignalsMixin):
         self.trigger('init')
 
     def cancelAllTimers(self):
-        for timer in self.timers:
+        # Canceled timers remove themselves from the list
+        for timer in list(self.timers):
             timer.cancel()
 
     def preShutdown(self):
@@ -105,21 +106,33 @@ class App(signalsmixin.SignalsMixin):
                 if p:
                     p.request.cancel()
 
+        from . import reachability
+        util.DEBUG_LOG('Stopping reachability probes...')
+        reachability.POOL.shutdown()
+
         if self.timers:
-            util.DEBUG_LOG('Canceling App() timers...')
+            util.DEBUG_LOG('Canceling App() timers: {0}'.format(util.SCHEDULER.getStats()))
             self.cancelAllTimers()
 
         if SERVERMANAGER.selectedServer:
             util.DEBUG_LOG('Closing server...')
             SERVERMANAGER.selectedServer.close()
 
+        from . import asyncadapter
+        util.DEBUG_LOG('Closing connection pool: {0}'.format(asyncadapter.POOL_MANAGER.getStats()))
+        asyncadapter.POOL_MANAGER.clear()
+
+        from . import metadatacache
+        util.DEBUG_LOG('Saving metadata cache: {0}'.format(metadatacache.CACHE.getStats()))
+        metadatacache.CACHE.save()
+
     def shutdown(self):
         if self.timers:
             util.DEBUG_LOG('Waiting for {0} App() timers: Started'.format(len(self.timers)))
 
             self.cancelAllTimers()
 
-            for timer in self.timers:
+            for timer in list(self.timers):
                 timer.join()
 
             util.DEBUG_LOG('Waiting for App() timers: Finished')
@@ -1,9 +1,11 @@
 from __future__ import absolute_import
+import time
 import random
 
 from . import http
 from . import callback
 from . import util
+from . import reachability
 
 
 class ConnectionSource(int):
@@ -34,6 +36,9 @@ class PlexConnection(object):
     SCORE_REACHABLE = 4
     SCORE_LOCAL = 2
     SCORE_SECURE = 1
+    SCORE_RTT = 0.5  # bonus for fast connections, always less than any of the above
+
+    RTT_SMOOTHING = 0.5
 
     SOURCE_BY_VAL = {
         1: SOURCE_MANUAL,
@@ -59,6 +64,9 @@ class PlexConnection(object):
 
         self.lastTestedAt = 0
         self.hasPendingRequest = False
+        self.rtt = None
+        self.successes = 0
+        self.failures = 0
 
         self.getScore(True)
 
@@ -135,7 +143,7 @@ class PlexConnection(object):
                 server.activeConnection.isSecure
             ):
                 util.DEBUG_LOG("Invalid insecure connection test in progress")
-            self.request = http.HttpRequest(self.buildUrl(server, "/"))
+            self.request = reachability.ReachabilityRequest(self.buildUrl(server, "/"))
             context = self.request.createRequestContext("reachability", callback.Callable(self.onReachabilityResponse))
             context.server = server
             util.addPlexHeaders(self.request, server.getToken())
@@ -150,25 +158,27 @@ class PlexConnection(object):
             self.request.cancel()
 
     def onReachabilityResponse(self, request, response, context):
+        context.responded = True
         self.hasPendingRequest = False
-        # It's possible we may have a result pending before we were able
-        # to cancel it, so we'll just ignore it.
-
-        # if request.ignoreResponse:
-        #     return
 
         if response.isSuccess():
             data = response.getBodyXml()
             if data is not None and context.server.collectDataFromRoot(data):
                 self.state = self.STATE_REACHABLE
+                self.updateRTT(time.time() - context.started)
+                self.successes += 1
             else:
                 # This is unexpected, but treat it as unreachable
                 util.ERROR_LOG("Unable to parse root response from {0}".format(context.server))
                 self.state = self.STATE_UNREACHABLE
         elif response.getStatus() == 401:
             self.state = self.STATE_UNAUTHORIZED
+        elif request.ignoreResponse:
+            # Canceled because another connection won (or we're shutting down), we didn't learn anything new
+            util.DEBUG_LOG("Reachability test canceled for {0}".format(self.address))
         else:
             self.state = self.STATE_UNREACHABLE
+            self.failures += 1
 
         self.getScore(True)
 
@@ -200,14 +210,34 @@ class PlexConnection(object):
 
         return '{0}{1}{2}'.format(self.address, path, param)
 
+    def updateRTT(self, rtt):
+        if self.rtt is None:
+            self.rtt = rtt
+        else:
+            self.rtt += (rtt - self.rtt) * self.RTT_SMOOTHING
+
     def getScore(self, recalc=False):
         if recalc:
             self.score = 0
             if self.state == self.STATE_REACHABLE:
                 self.score += self.SCORE_REACHABLE
+                if self.rtt is not None:
+                    self.score += self.SCORE_RTT / (1 + self.rtt * 10)
             if self.isSecure:
                 self.score += self.SCORE_SECURE
             if self.isLocal:
                 self.score += self.SCORE_LOCAL
 
         return self.score
+
+    def getHistoryScore(self):
+        # How well this connection did so far, including earlier sessions. Used to test the likely winners first.
+        tests = self.successes + self.failures
+        if not tests:
+            return 0
+
+        return float(self.successes) / tests + (self.rtt is not None and self.SCORE_RTT / (1 + self.rtt * 10) or 0)
+
+    def getPotentialScore(self):
+        # The best score this connection could end up with once its pending test succeeds, ignoring RTT
+        return self.SCORE_REACHABLE + (self.isSecure and self.SCORE_SECURE or 0) + (self.isLocal and self.SCORE_LOCAL or 0)
@@ -33,7 +33,23 @@ def registerLibFactory(ftype):
     return wrap
 
 
+# Low-cardinality attribute values (codecs, types, languages...) are interned so
+# the thousands of elements in a large library share one string per value
+INTERNED_ATTRIBUTES = frozenset((
+    'type', 'streamType', 'codec', 'audioCodec', 'videoCodec', 'container', 'profile', 'videoProfile',
+    'videoResolution', 'videoFrameRate', 'aspectRatio', 'audioProfile', 'audioChannelLayout', 'channels',
+    'audioChannels', 'language', 'languageCode', 'languageTag', 'chromaLocation', 'chromaSubsampling',
+    'colorPrimaries', 'colorRange', 'colorSpace', 'colorTrc', 'scanType', 'frameRate', 'bitDepth',
+    'samplingRate', 'selected', 'default', 'forced', 'optimizedForStreaming', 'has64bitOffsets', 'hasThumbnail',
+    'contentRating', 'librarySectionID', 'librarySectionTitle', 'librarySectionKey', 'studio',
+    'grandparentTitle', 'grandparentKey', 'grandparentRatingKey', 'grandparentThumb', 'grandparentArt',
+    'parentTitle', 'parentKey', 'parentRatingKey', 'parentThumb', 'parentIndex', 'year'
+))
+
+
 class PlexValue(six.text_type):
+    __slots__ = ('parent', 'NA')
+
     def __new__(cls, value, parent=None):
         self = super(PlexValue, cls).__new__(cls, value)
         self.parent = parent
@@ -142,15 +158,20 @@ class Checks(object):
 
 
 class PlexObject(Checks):
+    # XML attributes are kept as-is and only wrapped in a PlexValue on first access
+    _attrib = None
+
+    # Defaults live on the class so they don't take up room in every instance dict
+    key = None
+    mediaChoice = None
+    titleSort = PlexValue('')
+    deleted = False
+    _reloaded = False
+
     def __init__(self, data, initpath=None, server=None, container=None):
         self.initpath = initpath
-        self.key = None
         self.server = server
         self.container = container
-        self.mediaChoice = None
-        self.titleSort = PlexValue('')
-        self.deleted = False
-        self._reloaded = False
         self.data = data
 
         if data is None:
@@ -165,15 +186,57 @@ class PlexObject(Checks):
             return
 
         self.name = data.tag
-        for k, v in data.attrib.items():
-            if k in ("container",):
-                k = "attrib_%s" % k
+        self._setAttribs(data.attrib)
+
+    def _setAttribs(self, attrib):
+        if 'attrib_container' in attrib:
+            # serialize() writes the container attribute under its alias, keep it where the lookup expects it
+            attrib = dict(attrib)
+            attrib.setdefault('container', attrib.pop('attrib_container'))
+
+        if self._attrib is not None:
+            # Reloading: new values win, attributes missing from the new data are kept
+            merged = dict(self._attrib)
+            merged.update(attrib)
+            attrib = merged
+
+        self._attrib = attrib
+
+        for k in INTERNED_ATTRIBUTES.intersection(attrib):
+            attrib[k] = _intern(attrib[k])
 
-            setattr(self, k, PlexValue(v, self))
+        # Anything already set on the instance or defined on the class would
+        # shadow the lazy lookup in __getattr__, so those are set right away
+        for k in [k for k in self.__dict__ if k in attrib and k != 'container']:
+            setattr(self, k, PlexValue(attrib[k], self))
+
+        for k in _classAttributes(self.__class__).intersection(attrib):
+            setattr(self, k, PlexValue(attrib[k], self))
+
+    def _attribKey(self, attr):
+        if self._attrib is None or attr == 'container':
+            return None
+
+        key = attr == 'attrib_container' and 'container' or attr
+        return key in self._attrib and key or None
+
+    def _blankValue(self, NA=False):
+        # One shared empty value (and one shared "not available" value) per object
+        name = NA and '_blankNA' or '_blank'
+        value = self.__dict__.get(name)
+        if value is None:
+            value = PlexValue('', self)
+            value.NA = NA
+            self.__dict__[name] = value
+
+        return value
 
     def __getattr__(self, attr):
-        a = PlexValue('', self)
-        a.NA = True
+        key = self._attribKey(attr)
+        if key:
+            a = PlexValue(self._attrib[key], self)
+        else:
+            a = self._blankValue(NA=True)
 
         try:
             setattr(self, attr, a)
@@ -182,13 +245,28 @@ class PlexObject(Checks):
 
         return a
 
+    def __delattr__(self, attr):
+        key = self._attribKey(attr)
+        if key:
+            self._attrib = dict(self._attrib)
+            del self._attrib[key]
+            self.__dict__.pop(attr, None)
+        else:
+            Checks.__delattr__(self, attr)
+
     def exists(self):
         # Used for media items - for others we just return True
         return True
 
     def get(self, attr, default=''):
         ret = self.__dict__.get(attr)
-        return ret is not None and ret or PlexValue(default, self)
+        if ret is None and self._attribKey(attr):
+            ret = getattr(self, attr)
+        if ret is not None and ret:
+            return ret
+        if default == '':
+            return self._blankValue()
+        return PlexValue(default, self)
 
     def set(self, attr, value):
         setattr(self, attr, PlexValue(six.text_type(value), self))
@@ -208,21 +286,30 @@ class PlexObject(Checks):
 
     @property
     def defaultThumb(self):
-        return self.__dict__.get('thumb') and self.thumb or PlexValue('', self)
+        return self.get('thumb')
 
     @property
     def defaultArt(self):
-        return self.__dict__.get('art') and self.art or PlexValue('', self)
+        return self.get('art')
 
     def refresh(self):
         import requests
         self.server.query('%s/refresh' % self.key, method=requests.put)
 
-    def reload(self, _soft=False, **kwargs):
+    def reload(self, _soft=False, _batch=False, **kwargs):
         """ Reload the data for this object from PlexServer XML. """
         if _soft and self._reloaded:
             return self
 
+        if _batch and self.get('ratingKey'):
+            # Share a single multi-key request with other items reloaded at the same time
+            from . import metadatabatch
+            metadatabatch.BATCHER.reload(self, kwargs, _soft)
+            return self
+
+        if not _soft:
+            self._prepareReload()
+
         kwargs["includeMarkers"] = 1
 
         try:
@@ -248,6 +335,9 @@ class PlexObject(Checks):
 
         return self
 
+    def _prepareReload(self):
+        pass
+
     def softReload(self, **kwargs):
         return self.reload(_soft=True, **kwargs)
 
@@ -397,8 +487,13 @@ class PlexObject(Checks):
         import json
         odict = {}
         if full:
-            for k, v in self.__dict__.items():
-                if k not in ('server', 'container', 'media', 'initpath', '_data') and v:
+            attrs = {}
+            for k in self._attrib or ():
+                attrs[k == 'container' and 'attrib_container' or k] = self._attrib[k]
+            attrs.update(self.__dict__)
+
+            for k, v in attrs.items():
+                if k not in ('server', 'container', 'media', 'initpath', '_data', '_attrib') and v:
                     odict[k] = v
         else:
             odict['key'] = self.key
@@ -508,6 +603,23 @@ class PlexMediaItemList(PlexItemList):
         return self._items
 
 
+_CLASS_ATTRIBUTES = {}
+
+
+def _intern(value):
+    try:
+        return six.moves.intern(value)
+    except TypeError:
+        return value
+
+
+def _classAttributes(cls):
+    names = _CLASS_ATTRIBUTES.get(cls)
+    if names is None:
+        names = _CLASS_ATTRIBUTES[cls] = frozenset(dir(cls))
+    return names
+
+
 def findItem(server, path, title):
     for elem in server.query(path):
         if elem.attrib.get('title').lower() == title.lower():
@@ -527,6 +639,8 @@ def buildItem(server, elem, initpath, bytag=False, container=None, tag_fallback=
 
 
 class ItemContainer(list):
+    complete = True  # False if the request failed or its response was cut off
+
     def __getattr__(self, attr):
         return getattr(self.container, attr)
 
@@ -536,12 +650,21 @@ class ItemContainer(list):
 
 
 def listItems(server, path, libtype=None, watched=None, bytag=False, data=None, container=None, offset=None,
-              limit=None, tag_fallback=False, **kwargs):
-    data = data if data is not None else server.query(path, offset=offset, limit=limit, **kwargs)
+              limit=None, tag_fallback=False, stream=False, **kwargs):
+    status = None
+    if data is None and stream:
+        # Build items while the response is still being parsed
+        status = {}
+        elems = server.queryIter(path, offset=offset, limit=limit, status=status, **kwargs)
+        data = next(elems, None)
+    else:
+        data = data if data is not None else server.query(path, offset=offset, limit=limit, **kwargs)
+        elems = data
+
     container = container or PlexContainer(data, path, server, path)
     items = ItemContainer().init(container)
 
-    for elem in data:
+    for elem in elems:
         if libtype and elem.attrib.get('type') != libtype:
             continue
         if watched is True and elem.attrib.get('viewCount', 0) == 0:
@@ -553,6 +676,9 @@ def listItems(server, path, libtype=None, watched=None, bytag=False, data=None,
         except exceptions.UnknownType:
             pass
 
+    if status is not None and not status.get('complete'):
+        items.complete = False
+
     return items
 
 
@@ -566,6 +566,24 @@ class PlexPlayer(object):
 
         return None
 
+    def getBifIndexes(self):
+        """
+        (startOffset, duration, url) of the whole BIF index file of every indexed part, where getBifUrl()
+        points at the single image for an offset.
+        """
+        server = self.item.getServer()
+        indexes = []
+        startOffset = 0
+        for part in self.media.parts:
+            duration = part.duration.asInt()
+            bifUrl = part.getIndexPath("hd") or part.getIndexPath("sd")
+            if bifUrl is not None:
+                indexes.append((startOffset, duration, server.buildUrl(bifUrl, True)))
+
+            startOffset += duration
+
+        return indexes
+
     def buildTranscode(self, server, obj, partIndex, directStream, isCurrentPart):
         util.DEBUG_LOG('buildTranscode()')
         obj.transcodeServer = server
@@ -133,7 +133,7 @@ class ResourceConnection(plexobjects.PlexObject):
         return headers
 
     def query(self, path, method=None, token=None, **kwargs):
-        method = method or http.requests.get
+        method = method or http.Session().get
         url = self.getURL(path)
         util.LOG('{0} {1}'.format(method.__name__.upper(), url))
         response = method(url, headers=self.headers(token), timeout=util.TIMEOUT, **kwargs)
@@ -8,6 +8,7 @@ from . import compat
 from . import verlib
 import re
 import json
+import threading
 from xml.etree import ElementTree
 
 from . import signalsmixin
@@ -15,6 +16,7 @@ from . import plexobjects
 from . import plexresource
 from . import plexlibrary
 from . import asyncadapter
+from . import metadatacache
 from six.moves import range
 # from plexapi.client import Client
 # from plexapi.playqueue import PlayQueue
@@ -46,6 +48,8 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
 
         self.pendingReachabilityRequests = 0
         self.pendingSecureRequests = 0
+        self.warmConnection = None
+        self.warmStarting = False
 
         self.features = {}
         self.librariesByUuid = {}
@@ -177,7 +181,7 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             util.WARN_LOG("Server connection is None, returning an empty url")
             return ""
 
-    def query(self, path, method=None, **kwargs):
+    def _startQuery(self, path, method=None, statusCodes=(200, 201), **kwargs):
         method = method or self.session.get
         url = self.buildUrl(path, includeToken=True)
 
@@ -196,12 +200,36 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             url = http.addUrlParam(url, "X-Plex-Container-Size=%s" % limit)
 
         util.LOG('{0} {1}'.format(method.__name__.upper(), re.sub('X-Plex-Token=[^&]+', 'X-Plex-Token=****', url)))
+        response = method(url, stream=True, **kwargs)
+        if response.status_code not in statusCodes:
+            response.close()
+            codename = http.status_codes.get(response.status_code, ['Unknown'])[0]
+            raise exceptions.BadRequest('({0}) {1}'.format(response.status_code, codename))
+
+        return response
+
+    def query(self, path, method=None, **kwargs):
+        if path.startswith(('/:/scrobble', '/:/unscrobble', '/:/rate')):
+            key = re.search(r'[?&]key=(\d+)', path)
+            metadatacache.CACHE.invalidateItem(self.uuid, key and key.group(1))
+
+        cachePath = self._cachePath(path, method, kwargs)
+        if cachePath:
+            data = self._queryCache(path, cachePath, **kwargs)
+            if data is not None:
+                return data
+
         try:
-            response = method(url, **kwargs)
-            if response.status_code not in (200, 201):
-                codename = http.status_codes.get(response.status_code, ['Unknown'])[0]
-                raise exceptions.BadRequest('({0}) {1}'.format(response.status_code, codename))
-            data = response.text.encode('utf8')
+            response = self._startQuery(path, method, **kwargs)
+            if response is None:
+                return None
+
+            try:
+                if cachePath:
+                    return self._parseAndCache(cachePath, response)
+                return http.parseXml(response)
+            finally:
+                response.close()
         except asyncadapter.TimeoutException:
             util.ERROR()
             util.MANAGER.refreshResources(True)
@@ -212,7 +240,101 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         except asyncadapter.CanceledException:
             return None
 
-        return ElementTree.fromstring(data) if data else None
+    def _cachePath(self, path, method, kwargs):
+        # Only plain GETs are cached; paging and query parameters become part of the cache key
+        if method or set(kwargs) - set(('offset', 'limit', 'params')) or not metadatacache.CACHE.accepts(path):
+            return None
+
+        params = kwargs.get('params')
+        if params is not None and not isinstance(params, dict):
+            return None
+
+        if kwargs.get('offset') is not None or kwargs.get('limit') is not None:
+            path = '{0}#{1},{2}'.format(path, kwargs.get('offset'), kwargs.get('limit'))
+
+        if params:
+            path = '{0}#{1}'.format(path, compat.urlencode(sorted(params.items())))
+
+        return path
+
+    def _queryCache(self, path, cachePath, **kwargs):
+        cached = metadatacache.CACHE.get(self.uuid, cachePath)
+        if not cached:
+            return None
+
+        body, fresh = cached
+        try:
+            data = ElementTree.fromstring(body)
+        except ElementTree.ParseError:
+            metadatacache.CACHE.invalidate(self.uuid, match=lambda p: p == cachePath)
+            return None
+
+        if not fresh and metadatacache.CACHE.startRevalidation(self.uuid, cachePath):
+            # Serve the stale copy right away and refresh it for next time
+            thread = threading.Thread(target=self._revalidate, args=(path, cachePath), kwargs=kwargs, name='REVALIDATE')
+            thread.daemon = True
+            thread.start()
+
+        return data
+
+    def _parseAndCache(self, cachePath, response):
+        body = []
+        data = http.parseXml(response, body)
+        metadatacache.CACHE.put(self.uuid, cachePath, b''.join(body), response.headers)
+        return data
+
+    def _revalidate(self, path, cachePath, **kwargs):
+        try:
+            headers = metadatacache.CACHE.getValidators(self.uuid, cachePath)
+            response = self._startQuery(path, headers=headers, statusCodes=(200, 201, 304), **kwargs)
+            if response is None:
+                return
+
+            try:
+                if response.status_code == 304:
+                    metadatacache.CACHE.touch(self.uuid, cachePath)
+                else:
+                    self._parseAndCache(cachePath, response)
+                    # Windows showing the stale copy query again, which is now served fresh from the cache
+                    util.APP.trigger('metadata:updated', server=self, path=path)
+            finally:
+                response.close()
+        except (asyncadapter.TimeoutException, asyncadapter.CanceledException, http.requests.ConnectionError):
+            util.DEBUG_LOG('Failed to revalidate cached {0}'.format(path))
+        except exceptions.BadRequest as e:
+            # The server answered, just not with the item (deleted, no longer shared, ...)
+            util.DEBUG_LOG('Dropping cached {0}: {1}'.format(path, e))
+            metadatacache.CACHE.invalidate(self.uuid, match=lambda p: p == cachePath)
+        except Exception:
+            util.ERROR()
+        finally:
+            metadatacache.CACHE.finishRevalidation(self.uuid, cachePath)
+
+    def queryIter(self, path, method=None, status=None, **kwargs):
+        """
+        Streaming variant of query(): yields the container element first and
+        then each of its child elements as soon as it has been parsed.
+        Errors end the iteration like query() returns None; pass a dict as
+        status to find out whether the whole response was read
+        (status['complete']).
+        """
+        try:
+            response = self._startQuery(path, method, **kwargs)
+            if response is None:
+                return
+
+            for elem in http.iterXml(response):
+                yield elem
+
+            if status is not None:
+                status['complete'] = True
+        except asyncadapter.TimeoutException:
+            util.ERROR()
+            util.MANAGER.refreshResources(True)
+        except http.requests.ConnectionError:
+            util.ERROR()
+        except asyncadapter.CanceledException:
+            pass
 
     def getImageTranscodeURL(self, path, width, height, **extraOpts):
         if not path:
@@ -334,24 +456,43 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         epoch = time.time()
         retrySeconds = 60
         minSeconds = 10
-        for i in range(len(self.connections)):
-            conn = self.connections[i]
+        # Connections that did well before go first
+        for conn in sorted(self.connections, key=lambda c: c.getHistoryScore(), reverse=True):
             diff = epoch - (conn.lastTestedAt or 0)
             if conn.hasPendingRequest:
                 util.DEBUG_LOG("Skip reachability test for {0} (has pending request)".format(conn))
             elif diff < minSeconds or (not self.isSecondary() and self.isReachable() and diff < retrySeconds):
                 util.DEBUG_LOG("Skip reachability test for {0} (checked {1} secs ago)".format(conn, diff))
-            elif conn.testReachability(self, allowFallback):
-                self.pendingReachabilityRequests += 1
-                if conn.isSecure:
-                    self.pendingSecureRequests += 1
-
-                if self.pendingReachabilityRequests == 1:
-                    self.trigger("started:reachability")
+            else:
+                self.testConnection(conn, allowFallback)
 
         if self.pendingReachabilityRequests <= 0:
             self.trigger("completed:reachability")
 
+    def testConnection(self, conn, allowFallback=False):
+        if not conn.testReachability(self, allowFallback):
+            return False
+
+        self.pendingReachabilityRequests += 1
+        if conn.isSecure:
+            self.pendingSecureRequests += 1
+
+        if self.pendingReachabilityRequests == 1:
+            self.trigger("started:reachability")
+
+        return True
+
+    def warmStart(self, conn):
+        """
+        Only tests the connection we used last time, so we can select this server after a single request. The other
+        connections are tested right away if it fails, or by the regular reachability pass otherwise.
+        """
+        util.LOG("Warm start for {0}: testing last active connection {1}".format(repr(self.name), conn.address))
+        self.warmStarting = True
+        if not self.testConnection(conn):
+            self.warmStarting = False
+            self.updateReachability()
+
     def cancelReachability(self):
         for i in range(len(self.connections)):
             conn = self.connections[i]
@@ -366,6 +507,12 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
 
         util.DEBUG_LOG("Reachability result for {0}: {1} is {2}".format(repr(self.name), connection.address, connection.state))
 
+        if self.warmStarting and self.pendingReachabilityRequests <= 0:
+            self.warmStarting = False
+            if connection.state != connection.STATE_REACHABLE:
+                util.LOG("Last active connection for {0} failed, testing all connections".format(repr(self.name)))
+                self.updateReachability()
+
         # Noneate active connection if the state is unreachable
         if self.activeConnection and self.activeConnection.state != plexresource.ResourceConnection.STATE_REACHABLE:
             self.activeConnection = None
@@ -381,8 +528,15 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
                 best = conn
 
         if best and best.state == best.STATE_REACHABLE:
-            if best.isSecure or self.pendingSecureRequests <= 0:
+            # The race is decided once none of the pending connections could beat this one. A pending
+            # connection that would only tie has lost already, as it answered later.
+            pending = [c for c in self.connections if c.hasPendingRequest and c is not best]
+            if all(c.getPotentialScore() <= int(best.getScore()) for c in pending):
                 self.activeConnection = best
+                if pending:
+                    util.DEBUG_LOG("Using {0} for {1}, canceling {2} slower test(s)".format(best.address, repr(self.name), len(pending)))
+                    for conn in pending:
+                        conn.cancelReachability()
             else:
                 util.DEBUG_LOG("Found a good connection for {0}, but holding out for better".format(repr(self.name)))
 
@@ -174,9 +174,15 @@ class PlexServerManager(signalsmixin.SignalsMixin):
         preferredServerExists = hasPreferredServer and self.searchContext.preferredServer in self.serversByUuid
 
         if preferSearch and hasPreferredServer and preferredServerExists:
-            # Update the preferred server immediately if requested and exits
-            util.LOG("Updating reachability for preferred server: force={0}".format(force))
-            self.serversByUuid[self.searchContext.preferredServer].updateReachability(force)
+            preferred = self.serversByUuid[self.searchContext.preferredServer]
+            if preferred.warmConnection and not self.selectedServer:
+                # Start with the connection that worked last time, the full pass reconciles in the background
+                preferred.warmStart(preferred.warmConnection)
+            else:
+                # Update the preferred server immediately if requested and exits
+                util.LOG("Updating reachability for preferred server: force={0}".format(force))
+                preferred.updateReachability(force)
+            preferred.warmConnection = None
             self.deferUpdateReachability()
         elif defer:
             self.deferUpdateReachability()
@@ -237,6 +243,10 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                 util.LOG("The selected channel server is not reachable")
                 self.channelServer = None
 
+        # Remember connection timings for the next start once the selected server's tests are done
+        if reachable and server == self.selectedServer and server.pendingReachabilityRequests <= 0:
+            self.saveState()
+
         # See if we should settle for the best we've found so far.
         self.checkSelectedServerSearch()
 
@@ -337,6 +347,12 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                 isFallback = hasSecureConn and conn['address'][:5] != "https"
                 sources = plexconnection.PlexConnection.SOURCE_BY_VAL[conn['sources']]
                 connection = plexconnection.PlexConnection(sources, conn['address'], conn['isLocal'], conn['token'], isFallback)
+                connection.rtt = conn.get('rtt')
+                connection.successes = conn.get('successes', 0)
+                connection.failures = conn.get('failures', 0)
+
+                if conn.get('active'):
+                    server.warmConnection = connection
 
                 # Keep the secure connection on top
                 if connection.isSecure:
@@ -377,7 +393,11 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                         'address': conn.address,
                         'isLocal': conn.isLocal,
                         'isSecure': conn.isSecure,
-                        'token': conn.token
+                        'token': conn.token,
+                        'active': conn == server.activeConnection,
+                        'rtt': conn.rtt,
+                        'successes': conn.successes,
+                        'failures': conn.failures
                     })
 
                 obj['servers'].append(serverObj)
@@ -0,0 +1,97 @@
+from __future__ import absolute_import
+import time
+import threading
+from collections import deque
+
+from . import http
+from . import util
+from . import threadutils
+
+POOL_SIZE = 8  # concurrent reachability probes across all servers
+WORKER_IDLE_TIMEOUT = 30  # seconds before an idle probe worker exits
+
+
+class ProbePool(object):
+    """
+    Runs reachability probes for every connection of every server on a bounded set of worker
+    threads, instead of a new thread per request. Probes are started in the order they were
+    submitted; canceled probes that haven't started yet are reported without touching the network.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._waiting = deque()  # one condition per idle worker, each is woken for exactly one job
+        self._workers = 0
+        self._shutdown = False
+
+    def submit(self, request, args, kwargs):
+        with self._lock:
+            self._queue.append((request, args, kwargs))
+            if self._waiting:
+                # A woken worker leaves the list right away, so a burst of submits never counts it twice
+                self._waiting.popleft().notify()
+            elif self._workers < self.size:
+                self._workers += 1
+                threadutils.KillableThread(target=self._work, name='REACHABILITY-PROBE').start()
+
+    def _next(self):
+        with self._lock:
+            if not self._queue and not self._shutdown:
+                waiter = threading.Condition(self._lock)
+                self._waiting.append(waiter)
+                waiter.wait(WORKER_IDLE_TIMEOUT)
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+
+            if not self._queue:
+                self._workers -= 1
+                return None
+
+            return self._queue.popleft()
+
+    def shutdown(self):
+        # Idle workers exit right away, busy ones once the queue is drained (requests are canceled by then)
+        with self._lock:
+            self._shutdown = True
+            while self._waiting:
+                self._waiting.popleft().notify()
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if not job:
+                return
+
+            request, args, kwargs = job
+            try:
+                request.probe(*args, **kwargs)
+            except Exception:
+                util.ERROR()
+
+
+POOL = ProbePool()
+
+
+class ReachabilityRequest(http.HttpRequest):
+    """
+    HttpRequest for reachability tests. Runs on the shared probe pool and always calls back exactly
+    once - also when the connection was refused or the probe got canceled - so the server's pending
+    request count can't get stuck.
+    """
+
+    def startAsync(self, *args, **kwargs):
+        POOL.submit(self, args, kwargs)
+        return True
+
+    def probe(self, body=None, contentType=None, context=None):
+        context.responded = False
+        context.started = time.time()
+
+        if not self._cancel:
+            self._startAsync(body=body, contentType=contentType, context=context)
+
+        if not context.responded and context.callback:
+            self.removeAsPending()
+            context.callback(None, context)
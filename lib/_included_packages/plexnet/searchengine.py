@@ -0,0 +1,204 @@
+from __future__ import absolute_import
+import time
+import threading
+from collections import OrderedDict
+
+from six.moves.urllib.parse import urlencode
+
+from . import http
+from . import plexobjects
+from . import plexlibrary
+from . import util
+
+SEARCH_DELAY = 0.4  # seconds without typing before a query is sent
+SEARCH_CACHE_SIZE = 32  # (section, query) results kept in memory
+
+
+class SearchEngine(object):
+    """
+    Search-as-you-type for a server.
+
+    Queries are only sent once typing paused for SEARCH_DELAY; a request that's still running when the
+    query changes is canceled. Results are kept in a small LRU keyed by (section, query), so going back
+    to a query (backspace, switching the section filter back and forth) doesn't hit the server again.
+
+    callback(query, section, hubs, final) runs on the engine's thread for every hub as soon as it's
+    been parsed (final=False) and once more with the complete list (final=True). If the request for the
+    current query failed, the final call gets hubs=None. Cached results are handed out in a single final
+    call on the caller's thread.
+    """
+
+    def __init__(self, server, callback, count=10, delay=SEARCH_DELAY):
+        self.server = server
+        self.callback = callback
+        self.count = count
+        self.delay = delay
+        self.cache = OrderedDict()
+        self.condition = threading.Condition(threading.Lock())
+        self.current = None
+        self.pending = None
+        self.deadline = 0
+        self.request = None
+        self.requestKey = None
+        self.thread = None
+        self.closed = False
+        self.requests = 0
+        self.canceled = 0
+        self.hits = 0
+
+    def search(self, query, section=None):
+        key = (section, query.lower())
+        with self.condition:
+            self.current = key
+            self._cancelRequest(key)
+
+            hubs = self.cache.get(key)
+            if hubs is not None:
+                self.cache.pop(key)
+                self.cache[key] = hubs
+                self.hits += 1
+                self.pending = None
+            elif self.requestKey == key:
+                # Already on its way
+                self.pending = None
+            elif query:
+                self.pending = key
+                self.deadline = time.time() + self.delay
+                self._startThread()
+                self.condition.notify()
+            else:
+                self.pending = None
+
+        if hubs is not None:
+            self.callback(query, section, hubs, True)
+
+    def cancel(self):
+        with self.condition:
+            self.current = None
+            self.pending = None
+            self._cancelRequest()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.pending = None
+            self._cancelRequest()
+            self.condition.notify()
+
+        util.DEBUG_LOG('Search: {0} requests, {1} canceled, {2} cache hits'.format(self.requests, self.canceled, self.hits))
+
+    def _cancelRequest(self, key=None):
+        if self.request and self.requestKey != key:
+            util.DEBUG_LOG('Search: Canceling superseded query: {0}'.format(repr(self.requestKey[1])))
+            self.request.cancel()
+            self.request = None
+            self.requestKey = None
+            self.canceled += 1
+
+    def _startThread(self):
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.thread = threading.Thread(target=self._run, name='search.engine')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _next(self):
+        with self.condition:
+            while not self.closed:
+                if self.pending:
+                    wait = self.deadline - time.time()
+                    if wait <= 0:
+                        key = self.pending
+                        self.pending = None
+                        self.request = self._createRequest(key)
+                        self.requestKey = key
+                        self.requests += 1
+                        return key, self.request
+                else:
+                    wait = None
+
+                self.condition.wait(wait)
+
+            return None, None
+
+    def _run(self):
+        while True:
+            key, request = self._next()
+            if not key:
+                return
+
+            hubs = self._fetch(key, request)
+
+            with self.condition:
+                if self.request is request:
+                    self.request = None
+                    self.requestKey = None
+
+                if hubs is None:
+                    # Superseded queries stay quiet, a failed current one still ends the search
+                    if key != self.current or request._cancel:
+                        continue
+                else:
+                    self.cache[key] = hubs
+                    while len(self.cache) > SEARCH_CACHE_SIZE:
+                        self.cache.popitem(last=False)
+
+                    if key != self.current:
+                        continue
+
+            self.callback(key[1], key[0], hubs, True)
+
+    def _createRequest(self, key):
+        section, query = key
+        params = {'query': query, 'includeMarkers': 1}
+        if section:
+            params['sectionId'] = section
+        if self.count is not None:
+            params['limit'] = self.count
+
+        return http.HttpRequest(self.server.buildUrl('/hubs/search?' + urlencode(params), includeToken=True))
+
+    def _fetch(self, key, request):
+        """
+        Returns the hubs for the query, or None if the request failed or got canceled.
+        """
+        start = time.time()
+        try:
+            response = request.getPostWithTimeout(http.DEFAULT_TIMEOUT)
+            if response is None or request._cancel:
+                return None
+
+            if not response.ok:
+                response.close()
+                util.DEBUG_LOG('Search: Request failed ({0})'.format(response.status_code))
+                return None
+
+            hubs = []
+            container = None
+            elems = http.iterXml(response)
+            try:
+                for elem in elems:
+                    if container is None:
+                        container = plexobjects.PlexContainer(elem, initpath='/hubs/search', server=self.server, address='/hubs/search')
+                        continue
+
+                    hubs.append(plexlibrary.Hub(elem, server=self.server, container=container))
+                    if request._cancel or key != self.current:
+                        return None
+
+                    # Render each hub as soon as it's complete
+                    self.callback(key[1], key[0], hubs, False)
+            finally:
+                elems.close()
+        except Exception:
+            if request._cancel:
+                return None
+            util.ERROR()
+            return None
+
+        if request._cancel:
+            return None
+
+        util.DEBUG_LOG('Search: {0} hubs for {1} in {2:.2f}s'.format(len(hubs), repr(key[1]), time.time() - start))
+        return hubs
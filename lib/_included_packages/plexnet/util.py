@@ -5,6 +5,7 @@ import sys
 import time
 import platform
 import uuid
+import heapq
 import threading
 import six
 
@@ -214,6 +215,132 @@ class CompatEvent(Event):
         return self.isSet()
 
 
+class TimerScheduler(object):
+    """
+    Runs every Timer from a single thread. Pending timers are kept in a heap ordered by deadline;
+    canceling a timer only flags it (O(1)) and resetting pushes a new entry (O(log n)). Entries that
+    have been superseded are skipped when they reach the top, or compacted away once they pile up.
+    The thread is started on demand and exits as soon as no timers are left.
+    """
+    POLL_INTERVAL = 1.0  # how often to check for an abort while waiting for a far away deadline
+    SLOW_CALLBACK = 1.0
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = 0
+        self._stale = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._thread = None
+        self.live = 0
+
+    def schedule(self, timer):
+        with self._condition:
+            if timer._active:
+                self._stale += 1
+            else:
+                timer._active = True
+                timer._finished.clear()
+                self.live += 1
+
+            timer._generation += 1
+            self._push(timer)
+            self._compact()
+
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name='TIMER-SCHEDULER')
+                self._thread.daemon = True
+                self._thread.start()
+            else:
+                self._condition.notify()
+
+    def _push(self, timer):
+        self._sequence += 1
+        heapq.heappush(self._heap, (time.time() + timer.timeout, self._sequence, timer._generation, timer))
+
+    def _compact(self):
+        if self._stale < 64 or self._stale < len(self._heap) // 2:
+            return
+
+        self._heap = [e for e in self._heap if e[3]._active and e[3]._generation == e[2]]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def unschedule(self, timer):
+        with self._condition:
+            if not timer._active:
+                return False
+
+            timer._active = False
+            timer._generation += 1
+            self._stale += 1
+            self.live -= 1
+            timer._finished.set()
+            return True
+
+    def _next(self):
+        with self._condition:
+            while True:
+                while self._heap and (not self._heap[0][3]._active or self._heap[0][3]._generation != self._heap[0][2]):
+                    heapq.heappop(self._heap)
+                    self._stale = max(self._stale - 1, 0)
+
+                if not self._heap:
+                    self._thread = None
+                    return None
+
+                deadline, seq, generation, timer = self._heap[0]
+                if timer.shouldAbort():
+                    return heapq.heappop(self._heap)
+
+                now = time.time()
+                if deadline <= now:
+                    return heapq.heappop(self._heap)
+
+                self._condition.wait(min(deadline - now, self.POLL_INTERVAL))
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            if not entry:
+                return
+
+            deadline, seq, generation, timer = entry
+            if timer.shouldAbort():
+                timer._finish()
+                continue
+
+            start = time.time()
+            try:
+                timer.function(*timer.args, **timer.kwargs)
+            except:
+                ERROR()
+
+            if time.time() - start > self.SLOW_CALLBACK:
+                DEBUG_LOG('Timer {0}: Slow callback ({1:.2f}s)'.format(repr(timer.function), time.time() - start))
+
+            with self._condition:
+                # Canceled or reset while running
+                if not timer._active or timer._generation != generation:
+                    continue
+
+                if timer.repeat:
+                    self._push(timer)
+                    continue
+
+            timer._finish()
+
+    def getStats(self):
+        with self._condition:
+            return {
+                'live': self.live,
+                'queued': len(self._heap),
+                'running': self._thread is not None
+            }
+
+
+SCHEDULER = TimerScheduler()
+
+
 class Timer(object):
     def __init__(self, timeout, function, repeat=False, *args, **kwargs):
         self.function = function
@@ -221,54 +348,43 @@ class Timer(object):
         self.repeat = repeat
         self.args = args
         self.kwargs = kwargs
-        self._reset = False
-        self.event = CompatEvent()
+        self._active = False
+        self._generation = 0
+        self._finished = CompatEvent()
         self.start()
 
     def start(self):
-        self.event.clear()
-        self.thread = threading.Thread(target=self.run, name='TIMER:{0}'.format(self.function), *self.args, **self.kwargs)
-        self.thread.start()
-
-    def run(self):
-        DEBUG_LOG('Timer {0}: {1}'.format(repr(self.function), self._reset and 'RESET'or 'STARTED'))
-        try:
-            while not self.event.isSet() and not self.shouldAbort():
-                while not self.event.wait(self.timeout) and not self.shouldAbort():
-                    if self._reset:
-                        return
-
-                    self.function(*self.args, **self.kwargs)
-                    if not self.repeat:
-                        return
-        finally:
-            if not self._reset:
-                if self in APP.timers:
-                    APP.timers.remove(self)
-
-                DEBUG_LOG('Timer {0}: FINISHED'.format(repr(self.function)))
-
-            self._reset = False
+        DEBUG_LOG('Timer {0}: STARTED'.format(repr(self.function)))
+        SCHEDULER.schedule(self)
+
+    def _finish(self):
+        if not SCHEDULER.unschedule(self):
+            return
+
+        if self in APP.timers:
+            APP.timers.remove(self)
+
+        DEBUG_LOG('Timer {0}: FINISHED'.format(repr(self.function)))
 
     def cancel(self):
-        self.event.set()
+        self._finish()
 
     def reset(self):
-        self._reset = True
-        self.cancel()
-        if self.thread and self.thread.is_alive():
-            self.thread.join()
-        self.start()
+        DEBUG_LOG('Timer {0}: RESET'.format(repr(self.function)))
+        SCHEDULER.schedule(self)
 
     def shouldAbort(self):
         return False
 
     def join(self):
-        if self.thread.is_alive():
-            self.thread.join()
+        # Callbacks run on the scheduler thread, it can't wait for itself
+        if threading.current_thread() is SCHEDULER._thread:
+            return
+
+        self._finished.wait(None)
 
     def isExpired(self):
-        return self.event.isSet()
+        return not self._active
 
 
 TIMER = Timer
@@ -277,14 +277,12 @@ class PlayableVideo(Video, RelatedMixin):
             self.extras = PlexVideoItemList(data.find('Extras'), initpath=self.initpath, server=self.server, container=self)
             self.chapters = plexobjects.PlexItemList(data, media.Chapter, media.Chapter.TYPE)
 
-    def reload(self, *args, **kwargs):
-        if not kwargs.get('_soft'):
-            if self.get('viewCount'):
-                del self.viewCount
-            if self.get('viewOffset'):
-                del self.viewOffset
-        Video.reload(self, *args, **kwargs)
-        return self
+    def _prepareReload(self):
+        # Reloaded attributes are merged into the existing ones, but these are left out when they're unset
+        if self.get('viewCount'):
+            del self.viewCount
+        if self.get('viewOffset'):
+            del self.viewOffset
 
     def postPlay(self, **params):
         query = '/hubs/metadata/{0}/postplay'.format(self.ratingKey)
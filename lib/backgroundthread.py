@@ -1,17 +1,18 @@
 from __future__ import absolute_import
-import six.moves.queue
-import heapq
+import time
+import threading
 from kodi_six import xbmc
 from . import util
 from plexnet import threadutils
 from six.moves import range
 
 
+WORKER_IDLE_POLL = 1.0  # how often idle workers check for Kodi shutting down
+
+
 class Tasks(list):
     def add(self, task):
-        for t in self:
-            if not t.isValid():
-                self.remove(t)
+        self[:] = [t for t in self if t.isValid()]
 
         if isinstance(task, list):
             self += task
@@ -24,6 +25,11 @@ class Tasks(list):
 
 
 class Task:
+    _heapIndex = None
+    _taskQueue = None
+    _sequence = 0
+    _queuedAt = None
+
     def __init__(self, priority=None):
         self._priority = priority
         self._canceled = False
@@ -50,6 +56,9 @@ class Task:
 
     def cancel(self):
         self._canceled = True
+        queue = self._taskQueue
+        if queue:
+            queue.remove(self)
 
     def isCanceled(self):
         return self._canceled or util.MONITOR.abortRequested()
@@ -57,23 +66,161 @@ class Task:
     def isValid(self):
         return not self.finished and not self._canceled
 
+    def isQueued(self):
+        return self._taskQueue is not None
+
+
+class TaskQueue(object):
+    """
+    Blocking priority queue of tasks backed by an indexed binary heap.
 
-class MutablePriorityQueue(six.moves.queue.PriorityQueue):
-    def _get(self, heappop=heapq.heappop):
-            self.queue.sort()
-            return heappop(self.queue)
+    Every queued task knows its position in the heap, so changing its priority or removing it
+    (e.g. when it's canceled) is O(log n). Tasks with equal priority run in the order they were added.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._closed = False
+        self.maxDepth = 0
+        self.processed = 0
+        self.canceled = 0
+        self.totalWait = 0.0
+        self.maxWait = 0.0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
+
+    def _key(self, idx):
+        task = self._heap[idx]
+        return task._priority, task._sequence
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        heap[i]._heapIndex = i
+        heap[j]._heapIndex = j
+
+    def _siftUp(self, idx):
+        while idx:
+            parent = (idx - 1) >> 1
+            if self._key(idx) >= self._key(parent):
+                break
+            self._swap(idx, parent)
+            idx = parent
+
+    def _siftDown(self, idx):
+        size = len(self._heap)
+        while True:
+            smallest = idx
+            for child in (2 * idx + 1, 2 * idx + 2):
+                if child < size and self._key(child) < self._key(smallest):
+                    smallest = child
+            if smallest == idx:
+                break
+            self._swap(idx, smallest)
+            idx = smallest
+
+    def _removeAt(self, idx):
+        heap = self._heap
+        last = len(heap) - 1
+        if idx != last:
+            self._swap(idx, last)
+        task = heap.pop()
+        task._heapIndex = None
+        task._taskQueue = None
+
+        if idx < len(heap):
+            self._siftDown(idx)
+            self._siftUp(idx)
+
+        return task
+
+    def put(self, task):
+        with self._condition:
+            if task._heapIndex is not None and task._taskQueue is self:
+                self._reprioritize(task, task._priority)
+                return
+
+            self._counter += 1
+            task._sequence = self._counter
+            task._queuedAt = time.time()
+            task._taskQueue = self
+            task._heapIndex = len(self._heap)
+            self._heap.append(task)
+            self._siftUp(task._heapIndex)
+            self.maxDepth = max(self.maxDepth, len(self._heap))
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Returns the most urgent task, or None if nothing showed up within the timeout or the queue was closed.
+        """
+        with self._condition:
+            if not self._heap and not self._closed:
+                self._condition.wait(timeout)
+
+            if not self._heap or self._closed:
+                return None
+
+            task = self._removeAt(0)
+            wait = time.time() - task._queuedAt
+            self.processed += 1
+            self.totalWait += wait
+            self.maxWait = max(self.maxWait, wait)
+            return task
+
+    def remove(self, task):
+        with self._condition:
+            if task._taskQueue is not self or task._heapIndex is None:
+                return False
+
+            self._removeAt(task._heapIndex)
+            self.canceled += 1
+            return True
+
+    def _reprioritize(self, task, priority):
+        task._priority = priority
+        self._siftUp(task._heapIndex)
+        self._siftDown(task._heapIndex)
+
+    def reprioritize(self, task, priority):
+        with self._condition:
+            if task._taskQueue is not self or task._heapIndex is None:
+                task._priority = priority
+                return False
+
+            self._reprioritize(task, priority)
+            return True
 
     def lowest(self):
-        """Return the lowest priority item in the queue (not reliable!)."""
-        self.mutex.acquire()
-        try:
-            lowest = self.queue and min(self.queue) or None
-        except:
-            lowest = None
-            util.ERROR()
-        finally:
-            self.mutex.release()
-        return lowest
+        """Return the lowest priority value in the queue or None if it is empty."""
+        with self._condition:
+            if not self._heap:
+                return None
+            return self._heap[0]._priority
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            while self._heap:
+                self._removeAt(len(self._heap) - 1)
+            self._condition.notify_all()
+
+    def getStats(self):
+        with self._condition:
+            return {
+                'depth': len(self._heap),
+                'maxDepth': self.maxDepth,
+                'processed': self.processed,
+                'canceled': self.canceled,
+                'avgWait': self.processed and self.totalWait / self.processed or 0.0,
+                'maxWait': self.maxWait
+            }
 
 
 class BackgroundWorker:
@@ -107,18 +254,17 @@ class BackgroundWorker:
         self._thread.start()
 
     def _queueLoop(self):
-        if self._queue.empty():
-            return
+        util.DEBUG_LOG('BGThreader: ({0}): Started'.format(self.name))
+        while not self.aborted():
+            task = self._queue.get(WORKER_IDLE_POLL)
+            if not task:
+                continue
 
-        util.DEBUG_LOG('BGThreader: ({0}): Active'.format(self.name))
-        try:
-            while not self.aborted():
-                self._task = self._queue.get_nowait()
-                self._runTask(self._task)
-                self._queue.task_done()
-                self._task = None
-        except six.moves.queue.Empty:
-            util.DEBUG_LOG('BGThreader ({0}): Idle'.format(self.name))
+            self._task = task
+            self._runTask(task)
+            self._task = None
+
+        util.DEBUG_LOG('BGThreader: ({0}): Stopped'.format(self.name))
 
     def shutdown(self):
         self.abort()
@@ -132,13 +278,13 @@ class BackgroundWorker:
             util.DEBUG_LOG('BGThreader: thread ({0}): Done'.format(self.name))
 
     def working(self):
-        return self._thread and self._thread.is_alive()
+        return bool(self._task)
 
 
 class BackgroundThreader:
     def __init__(self, name=None, worker_count=8):
         self.name = name
-        self._queue = MutablePriorityQueue()
+        self._queue = TaskQueue()
         self._abort = False
         self._priority = -1
         self.workers = [BackgroundWorker(self._queue, 'queue.{0}:worker.{1}'.format(self.name, x)) for x in range(worker_count)]
@@ -151,12 +297,14 @@ class BackgroundThreader:
         self._abort = True
         for w in self.workers:
             w.abort()
+        self._queue.close()
         return self
 
     def aborted(self):
         return self._abort or util.MONITOR.abortRequested()
 
     def shutdown(self):
+        util.DEBUG_LOG('BGThreader: Shutting down ({0}): {1}'.format(self.name, self.getStats()))
         self.abort()
 
         for w in self.workers:
@@ -188,6 +336,9 @@ class BackgroundThreader:
         self.startWorkers()
 
     def startWorkers(self):
+        if self.aborted():
+            return
+
         for w in self.workers:
             w.start()
 
@@ -198,18 +349,19 @@ class BackgroundThreader:
         return any([w.working() for w in self.workers])
 
     def getLowestPrority(self):
-        lowest = self._queue.lowest()
-        if not lowest:
-            return None
-
-        return lowest._priority
+        return self._queue.lowest()
 
     def moveToFront(self, qitem):
         lowest = self.getLowestPrority()
         if lowest is None:
             return
 
-        qitem._priority = lowest - 1
+        self._queue.reprioritize(qitem, lowest - 1)
+
+    def getStats(self):
+        stats = self._queue.getStats()
+        stats['busy'] = len([w for w in self.workers if w.working()])
+        return stats
 
 
 class ThreaderManager:
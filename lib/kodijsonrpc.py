@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 from kodi_six import xbmc
 import json
+import threading
 
 
 class JSONRPCMethod:
@@ -8,20 +9,28 @@ class JSONRPCMethod:
     class Exception(Exception):
         pass
 
-    def __init__(self):
+    def __init__(self, rpc=None):
+        self.rpc = rpc
         self.family = None
 
     def __getattr__(self, method):
+        family = self.family
+
         def handler(**kwargs):
             command = {
                 'jsonrpc': '2.0',
                 'id': 1,
-                'method': '{0}.{1}'.format(self.family, method)
+                'method': '{0}.{1}'.format(family, method)
             }
 
             if kwargs:
                 command['params'] = kwargs
 
+            batch = self.rpc and self.rpc.currentBatch()
+            if batch:
+                batch.add(command)
+                return None
+
             # xbmc.log(json.dumps(command))
             ret = json.loads(xbmc.executeJSONRPC(json.dumps(command)))
 
@@ -40,13 +49,79 @@ class JSONRPCMethod:
         return self
 
 
+class JSONRPCBatch:
+    """
+    Collects the calls made on this thread while the with block runs and sends them to Kodi as one
+    JSON-RPC batch when it ends. Kodi runs them in order. The calls themselves return None, and the
+    results are in .results afterwards, in call order. If any call failed, the first error is raised
+    once all results are in (None in .results for the failed calls).
+
+        with rpc.batch() as batch:
+            rpc.Playlist.Remove(playlistid=0, position=5)
+            rpc.Playlist.Remove(playlistid=0, position=2)
+    """
+
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.commands = []
+        self.results = []
+        self.errors = []
+        self.parent = None
+
+    def __enter__(self):
+        self.parent = self.rpc.currentBatch()
+        self.rpc.local.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.rpc.local.batch = self.parent
+        if exc_type is None:
+            self.send()
+
+    def add(self, command):
+        command['id'] = len(self.commands) + 1
+        self.commands.append(command)
+
+    def send(self):
+        commands, self.commands = self.commands, []
+        self.results = []
+        self.errors = []
+        if not commands:
+            return self.results
+
+        ret = json.loads(xbmc.executeJSONRPC(json.dumps(commands)))
+        if isinstance(ret, dict):  # A malformed batch gets a single error response
+            ret = [ret]
+
+        responses = dict((r.get('id'), r) for r in ret or [])
+        for command in commands:
+            response = responses.get(command['id']) or {}
+            if 'error' in response:
+                self.errors.append(response['error'])
+                self.results.append(None)
+            else:
+                self.results.append(response.get('result'))
+
+        if self.errors:
+            raise JSONRPCMethod.Exception(self.errors[0])
+
+        return self.results
+
+
 class KodiJSONRPC:
     def __init__(self):
-        self.methodHandler = JSONRPCMethod()
+        self.methodHandler = JSONRPCMethod(self)
+        self.local = threading.local()
 
     def __getattr__(self, family):
         return self.methodHandler(family)
 
+    def batch(self):
+        return JSONRPCBatch(self)
+
+    def currentBatch(self):
+        return getattr(self.local, 'batch', None)
+
 
 rpc = KodiJSONRPC()
 
@@ -7,6 +7,7 @@ if xbmc.getInfoLabel('Window(10000).Property(script.plex.running)') == "1":
     raise SystemExit
 
 import gc
+import time
 import atexit
 import threading
 import six
@@ -70,6 +71,7 @@ def main():
 
 
 def _main():
+    startedAt = time.time()
     util.DEBUG_LOG('[ STARTED: {0} -------------------------------------------------------------------- ]'.format(util.ADDON.getAddonInfo('version')))
     util.DEBUG_LOG('USER-AGENT: {0}'.format(plex.defaultUserAgent()))
     background.setSplash()
@@ -115,7 +117,8 @@ def _main():
 
                         util.DEBUG_LOG('Main: STARTING WITH SERVER: {0}'.format(selectedServer))
 
-                        windowutils.HOME = home.HomeWindow.open()
+                        windowutils.HOME = home.HomeWindow.open(started_at=startedAt)
+                        startedAt = None
                         util.CRON.cancelReceiver(windowutils.HOME)
 
                         if not windowutils.HOME.closeOption:
@@ -1,10 +1,15 @@
 from __future__ import absolute_import
 import base64
+import difflib
+import json
+import os
 import threading
+import time
 import six
 
 from kodi_six import xbmc
 from kodi_six import xbmcgui
+from kodi_six import xbmcvfs
 from . import backgroundthread
 from . import kodijsonrpc
 from . import colors
@@ -13,12 +18,27 @@ from . import util
 from plexnet import plexplayer
 from plexnet import plexapp
 from plexnet import signalsmixin
+from plexnet import bif
 from plexnet import util as plexnetUtil
 
 from six.moves import range
 
 FIVE_MINUTES_MILLIS = 300000
 
+MONITOR_TICK_INTERVAL = 1.0  # handler ticks (timelines, OSD timeouts, marker checks)
+MONITOR_UI_POLL = 0.2  # Kodi gives no callbacks for its OSD and fullscreen state, so we poll them
+MONITOR_UI_POLL_PAUSED = 0.5
+MONITOR_MAX_WAIT = 1.0  # idle and pre-play waits, playback events wake us earlier
+MONITOR_MIN_WAIT = 0.05
+
+PREPARED_PLAYBACK_TTL = 120  # seconds a speculative media choice and server decision stays usable
+PREPARED_PLAYBACK_WAIT = 10  # seconds to wait for a preparation that's still running when play is pressed
+
+if util.KODI_VERSION_MAJOR > 18:
+    BIF_FOLDER = os.path.join(xbmcvfs.translatePath("special://temp/"), "p4k", "bif")
+else:
+    BIF_FOLDER = os.path.join(xbmc.translatePath("special://temp/"), "p4k", "bif")
+
 
 class BasePlayerHandler(object):
     def __init__(self, player, session_id=None):
@@ -73,6 +93,12 @@ class BasePlayerHandler(object):
     def tick(self):
         pass
 
+    def nextDeadline(self):
+        """
+        Seconds until the handler wants to tick outside of the regular interval, or None
+        """
+        return None
+
     def close(self):
         pass
 
@@ -146,6 +172,7 @@ class SeekPlayerHandler(BasePlayerHandler):
         self.timelineType = 'video'
         self.ended = False
         self.bifURL = ''
+        self.bifCache = None
         self.title = ''
         self.title2 = ''
         self.reset()
@@ -168,9 +195,30 @@ class SeekPlayerHandler(BasePlayerHandler):
         self.title = title
         self.title2 = title2
         self.chapters = chapters or []
+        self.setupBif()
         self.getDialog(setup=True)
         self.dialog.setup(self.duration, int(self.baseOffset * 1000), self.bifURL, self.title, self.title2, chapters=self.chapters)
 
+    def setupBif(self):
+        indexes = self.bifURL and self.player.playerObject.getBifIndexes() or []
+        # Transcoded seeks restart playback of the same video, keep what we already have
+        if self.bifCache and self.bifCache.isFor(indexes):
+            return
+
+        self.closeBif()
+        if not indexes:
+            return
+
+        try:
+            self.bifCache = bif.BifCache(indexes, BIF_FOLDER)
+        except Exception:
+            util.ERROR()
+
+    def closeBif(self):
+        bifCache, self.bifCache = self.bifCache, None
+        if bifCache:
+            bifCache.close()
+
     def getDialog(self, setup=False):
         if not self.dialog:
             self.dialog = seekdialog.SeekDialog.create(show=False, handler=self)
@@ -485,8 +533,21 @@ class SeekPlayerHandler(BasePlayerHandler):
         if self.dialog:
             self.dialog.tick()
 
+    def nextDeadline(self):
+        # tick right when an intro/credits marker starts or ends
+        if not self.dialog or self.seeking == self.SEEK_IN_PROGRESS:
+            return None
+
+        offset = self.player.currentTime * 1000
+        boundary = self.dialog.nextMarkerBoundary(int(offset))
+        if boundary is None:
+            return None
+
+        return (boundary - offset) / 1000.0
+
     def close(self):
         self.hideOSD(delete=True)
+        self.closeBif()
 
     def sessionEnded(self):
         if self.ended:
@@ -495,6 +556,7 @@ class SeekPlayerHandler(BasePlayerHandler):
         util.DEBUG_LOG('Player: Video session ended')
         self.player.trigger('session.ended', session_id=self.sessionID)
         self.hideOSD(delete=True)
+        self.closeBif()
 
     __next__ = next
 
@@ -557,36 +619,64 @@ class AudioPlayerHandler(BasePlayerHandler):
             return
 
         current = plist.getposition()
-        size = plist.size()
+        try:
+            items = kodijsonrpc.rpc.Playlist.GetItems(playlistid=xbmc.PLAYLIST_MUSIC, properties=['comment']).get('items') or []
+        except:
+            util.ERROR()
+            return
 
-        # Remove everything but the current track
-        for x in range(size - 1, current, -1):  # First everything with a greater position
-            kodijsonrpc.rpc.Playlist.Remove(playlistid=xbmc.PLAYLIST_MUSIC, position=x)
-        for x in range(current):  # Then anything with a lesser position
-            kodijsonrpc.rpc.Playlist.Remove(playlistid=xbmc.PLAYLIST_MUSIC, position=0)
+        tracks = self.playQueue.items()
+        old = [(i.get('comment') or '').split(':', 1)[0] for i in items]
+        new = ['PLEX-{0}'.format(track.ratingKey) for track in tracks]
+
+        # The current track can't be removed without stopping playback, so it anchors the diff: whatever is
+        # before it in the playlist is matched against what's before it in the play queue, and the same after it.
+        swap = new.index(plexID) if plexID in new else None
+        if 0 <= current < len(old):
+            anchor = swap or 0
+            if swap is None:
+                new.insert(0, plexID)
+                tracks = [None] + list(tracks)
+            opcodes = self.playlistDiff(old[:current], new[:anchor], 0, 0) + \
+                self.playlistDiff(old[current + 1:], new[anchor + 1:], current + 1, anchor + 1)
+        else:
+            opcodes = self.playlistDiff(old, new, 0, 0)
 
-        swap = None
-        for idx, track in enumerate(self.playQueue.items()):
-            tid = 'PLEX-{0}'.format(track.ratingKey)
-            if tid == plexID:
-                # Save the position of the current track in the pq
-                swap = idx
+        removes = sorted((i for tag, i1, i2, j1, j2 in opcodes if tag in ('delete', 'replace') for i in range(i1, i2)), reverse=True)
+        inserts = [j for tag, i1, i2, j1, j2 in opcodes if tag in ('insert', 'replace') for j in range(j1, j2)]
 
-            url, li = self.player.createTrackListItem(track, index=idx + 1)
+        # One round trip for all the removes, done from the end so the positions stay valid
+        try:
+            with kodijsonrpc.rpc.batch():
+                for x in removes:
+                    kodijsonrpc.rpc.Playlist.Remove(playlistid=xbmc.PLAYLIST_MUSIC, position=x)
+        except:
+            util.ERROR()
 
-            plist.add(url, li)
+        # What's left is in play queue order, so adding the missing tracks in order rebuilds it
+        for idx in inserts:
+            url, li = self.player.createTrackListItem(tracks[idx], index=idx + 1)
+            plist.add(url, li, idx)
 
-        plist[0].setInfo('music', {
-            'playcount': swap + 1,
-        })
+        # Tracks that stayed but moved still show their old position as playcount
+        moved = [j for tag, i1, i2, j1, j2 in opcodes if tag == 'equal' and i1 != j1 for j in range(j1, j2)]
+        if swap is not None and swap != current:
+            moved.append(swap)
+        for idx in moved:
+            plist[idx].setInfo('music', {'playcount': idx + 1})
 
-        # Now swap the track to the correct position. This seems to be the only way to update the kodi playlist position to the current track's new position
-        if swap is not None:
-            kodijsonrpc.rpc.Playlist.Swap(playlistid=xbmc.PLAYLIST_MUSIC, position1=0, position2=swap + 1)
-            kodijsonrpc.rpc.Playlist.Remove(playlistid=xbmc.PLAYLIST_MUSIC, position=0)
+        util.DEBUG_LOG('Playlist sync: {0} removed, {1} added, {2} kept'.format(len(removes), len(inserts), len(new) - len(inserts)))
 
         self.player.trigger('playlist.changed')
 
+    def playlistDiff(self, old, new, oldOffset, newOffset):
+        """
+        Returns difflib opcodes turning the playlist entries old into the play queue entries new, with
+        positions shifted by the offsets.
+        """
+        opcodes = difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes()
+        return [(tag, i1 + oldOffset, i2 + oldOffset, j1 + newOffset, j2 + newOffset) for tag, i1, i2, j1, j2 in opcodes]
+
     def updatePlayQueue(self, delay=False):
         if not self.playQueue:
             return
@@ -710,6 +800,137 @@ class BGMPlayerTask(backgroundthread.Task):
         self.player.play(self.source, windowed=True)
 
 
+class PreparePlaybackTask(backgroundthread.Task):
+    def setup(self, video, offset, key, preparer):
+        self.video = video
+        self.offset = offset
+        self.key = key
+        self.preparer = preparer
+        self.playerObject = None
+        self.time = None
+        self.done = threading.Event()
+        return self
+
+    def cancel(self):
+        backgroundthread.Task.cancel(self)
+        self.done.set()
+
+    def run(self):
+        try:
+            if self.isCanceled():
+                return
+
+            start = time.time()
+            playerObject = plexplayer.PlexPlayer(self.video, self.offset, forceUpdate=True)
+            playerObject.build()
+            self.playerObject = playerObject.getServerDecision()
+            self.time = time.time()
+            util.DEBUG_LOG('Prepared playback of {0} (+{1}ms) in {2:.2f}s'.format(self.video, self.offset, self.time - start))
+        except plexplayer.DecisionFailure as e:
+            # Playing will run into this again and tell the user
+            util.DEBUG_LOG('Preparing playback of {0} failed: {1}'.format(self.video, e.reason))
+        except:
+            util.ERROR()
+        finally:
+            self.done.set()
+
+
+class PlaybackPreparer(object):
+    """
+    Runs the media choice and the server decision for videos the user is likely to play next (PrePlayWindow,
+    post-play) in the background, so pressing play only has to start the player.
+
+    Preparations are kept per (video, offset, settings hash). The hash covers the add-on settings, Kodi's
+    audio channels, the video's quality overrides and its selected media and streams, so changing any of
+    them makes the preparation miss and playback decides from scratch.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def settingsHash(self, video):
+        state = [
+            util.SETTINGS_CACHE.generation,
+            plexapp.util.INTERFACE.getGlobal('audioChannels'),
+            sorted(video.settings.prefOverrides.items())
+        ]
+        for media in video.media:
+            state.append((media.id, media.isSelected(), [[s.id for s in part.streams if s.isSelected()] for part in media.parts]))
+
+        return hash(repr(state))
+
+    def _key(self, video, offset):
+        return video.ratingKey, offset, self.settingsHash(video)
+
+    def prepare(self, video, offsets):
+        """
+        Starts preparing playback of video from each of offsets (ms), most likely first.
+        """
+        tasks = []
+        with self.lock:
+            self._expire()
+            for offset in offsets:
+                key = self._key(video, offset)
+                task = self.tasks.get(key)
+                if task and task.video is video and (task.playerObject or not task.done.is_set()):
+                    continue
+
+                self.tasks[key] = PreparePlaybackTask().setup(video, offset, key, self)
+                tasks.append(self.tasks[key])
+
+        if tasks:
+            backgroundthread.BGThreader.addTasksToFront(tasks)
+
+    def take(self, video, offset):
+        """
+        Returns the prepared (decided) player object for playing video from offset, or None.
+        """
+        try:
+            key = self._key(video, offset)
+        except:
+            util.ERROR()
+            return None
+
+        with self.lock:
+            task = self.tasks.pop(key, None)
+
+        if not task or task.video is not video:
+            self.misses += 1
+            return None
+
+        if not task.done.is_set():
+            util.DEBUG_LOG('Waiting for playback preparation of {0}'.format(video))
+            task.done.wait(PREPARED_PLAYBACK_WAIT)
+
+        if not task.playerObject or time.time() - task.time > PREPARED_PLAYBACK_TTL:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        util.DEBUG_LOG('Using prepared playback of {0} ({1} hits, {2} misses)'.format(video, self.hits, self.misses))
+        return task.playerObject
+
+    def invalidate(self, video=None):
+        """
+        Drops the preparations of video, or all of them.
+        """
+        with self.lock:
+            for key in list(self.tasks):
+                if video is None or self.tasks[key].video is video:
+                    self.tasks.pop(key).cancel()
+
+    def _expire(self):
+        # must be called with self.lock held
+        now = time.time()
+        for key in list(self.tasks):
+            task = self.tasks[key]
+            if task.time and now - task.time > PREPARED_PLAYBACK_TTL:
+                del self.tasks[key]
+
+
 class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
     STATE_STOPPED = "stopped"
     STATE_PLAYING = "playing"
@@ -734,7 +955,10 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
         self.handler = AudioPlayerHandler(self)
         self.playerObject = None
         self.currentTime = 0
+        self.paused = False
         self.thread = None
+        self._wake = threading.Event()
+        self.monitorStats = {}
         if xbmc.getCondVisibility('Player.HasMedia'):
             self.started = True
         self.open()
@@ -747,6 +971,7 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
 
     def close(self, shutdown=False):
         self._closed = True
+        self.wake()
 
     def reset(self):
         self.video = None
@@ -756,6 +981,7 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
         self.pauseAfterPlaybackStarted = False
         self.handler = AudioPlayerHandler(self)
         self.currentTime = 0
+        self.paused = False
 
     def control(self, cmd):
         if cmd == 'play':
@@ -853,10 +1079,14 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
             url=self.video.defaultArt.asTranscodedImageURL(1920, 1080, opacity=60, background=colors.noAlpha.Background)
         )
         try:
-            if not playerObject:
-                self.playerObject = plexplayer.PlexPlayer(self.video, offset, forceUpdate=force_update)
-                self.playerObject.build()
-            self.playerObject = self.playerObject.getServerDecision()
+            prepared = not playerObject and not seeking and PREPARER.take(self.video, offset)
+            if prepared:
+                self.playerObject = prepared
+            else:
+                if not playerObject:
+                    self.playerObject = plexplayer.PlexPlayer(self.video, offset, forceUpdate=force_update)
+                    self.playerObject.build()
+                self.playerObject = self.playerObject.getServerDecision()
         except plexplayer.DecisionFailure as e:
             util.showNotification(e.reason, header=util.T(32448, 'Playback Failed!'))
             return
@@ -999,6 +1229,9 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
     def createTrackListItem(self, track, fanart=None, index=0):
         data = base64.urlsafe_b64encode(track.serialize().encode("utf8")).decode("utf8")
         url = 'plugin://script.plexmod/play?{0}'.format(data)
+        stream = self.resolveTrackStream(track)
+        if stream:
+            url += '&stream={0}'.format(stream)
         li = xbmcgui.ListItem(track.title, path=url)
         li.setInfo('music', {
             'artist': six.text_type(track.originalTitle or track.grandparentTitle),
@@ -1020,6 +1253,36 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
             li.setArt({'fanart': fanart})
         return (url, li)
 
+    def resolveTrackStream(self, track):
+        """
+        Decides on the stream while the track is queued, so plugin.py can hand the URL straight to Kodi
+        without loading plexnet or reloading the track. Returns None if that's not possible without
+        asking the server, plugin.py then resolves the track itself.
+        """
+        try:
+            if not track.ensureMedia():
+                return None
+
+            obj = plexplayer.PlexAudioPlayer(track).build()
+            if not obj or not obj.get('url'):
+                return None
+
+            server = obj.get('transcodeServer') or track.getServer()
+            publishConnection(server)
+            info = {
+                'url': util.addURLParams(obj.url, {
+                    'X-Plex-Client-Profile-Name': 'Generic',
+                    'X-Plex-Client-Identifier': plexapp.util.INTERFACE.getGlobal('clientIdentifier')
+                }),
+                'server': server.uuid,
+                'address': server.activeConnection.address
+            }
+        except Exception:
+            util.ERROR()
+            return None
+
+        return base64.urlsafe_b64encode(json.dumps(info).encode("utf8")).decode("utf8")
+
     def onPrePlayStarted(self):
         util.DEBUG_LOG('Player - PRE-PLAY')
         self.trigger('preplay.started')
@@ -1029,6 +1292,8 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
 
     def onPlayBackStarted(self):
         self.started = True
+        self.paused = False
+        self.wake()
         if self.pauseAfterPlaybackStarted:
             self.control('pause')
             self.pauseAfterPlaybackStarted = False
@@ -1039,20 +1304,29 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
             return
         self.handler.onPlayBackStarted()
 
+    def onAVStarted(self):
+        util.DEBUG_LOG('Player - AV STARTED')
+        self.wake()
+
     def onPlayBackPaused(self):
         util.DEBUG_LOG('Player - PAUSED')
+        self.paused = True
+        self.wake()
         if not self.handler:
             return
         self.handler.onPlayBackPaused()
 
     def onPlayBackResumed(self):
         util.DEBUG_LOG('Player - RESUMED')
+        self.paused = False
+        self.wake()
         if not self.handler:
             return
 
         self.handler.onPlayBackResumed()
 
     def onPlayBackStopped(self):
+        self.wake()
         if not self.started:
             self.onPlayBackFailed()
 
@@ -1062,6 +1336,7 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
         self.handler.onPlayBackStopped()
 
     def onPlayBackEnded(self):
+        self.wake()
         if not self.started:
             self.onPlayBackFailed()
 
@@ -1072,6 +1347,7 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
 
     def onPlayBackSeek(self, time, offset):
         util.DEBUG_LOG('Player - SEEK: %i' % offset)
+        self.wake()
         if not self.handler:
             return
         self.handler.onPlayBackSeek(time, offset)
@@ -1128,15 +1404,34 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
             self.thread = threading.Thread(target=self._monitor, name='PLAYER:MONITOR')
             self.thread.start()
 
+    def wake(self):
+        self._wake.set()
+
+    def _wait(self, timeout):
+        """
+        Sleeps until timeout or a playback event, returns True if monitoring should stop
+        """
+        self.monitorStats['wakeups'] = self.monitorStats.get('wakeups', 0) + 1
+        if self._wake.wait(max(min(timeout, MONITOR_MAX_WAIT), 0)):
+            self._wake.clear()
+
+        return util.MONITOR.abortRequested() or self._closed
+
+    def _condition(self, condition, skips=0):
+        self.monitorStats['checks'] = self.monitorStats.get('checks', 0) + 1
+        self.monitorStats['skipped'] = self.monitorStats.get('skipped', 0) + skips
+        return xbmc.getCondVisibility(condition)
+
     def _monitor(self):
         try:
             while not util.MONITOR.abortRequested() and not self._closed:
                 if not self.isPlaying():
                     util.DEBUG_LOG('Player: Idling...')
 
-                while not self.isPlaying() and not util.MONITOR.abortRequested() and not self._closed:
-                    util.MONITOR.waitForAbort(0.1)
+                while not self.isPlaying() and not self._wait(MONITOR_MAX_WAIT):
+                    pass
 
+                self.monitorStats = {}
                 if self.isPlayingVideo():
                     util.DEBUG_LOG('Monitoring video...')
                     self._videoMonitor()
@@ -1147,6 +1442,9 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
                     util.DEBUG_LOG('Monitoring pre-play...')
                     self._preplayMonitor()
 
+                if self.monitorStats:
+                    util.DEBUG_LOG('Player: Monitor stats: {0}'.format(self.monitorStats))
+
             self.handler.close()
             self.close()
             util.DEBUG_LOG('Player: Closed')
@@ -1155,44 +1453,78 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
 
     def _preplayMonitor(self):
         self.onPrePlayStarted()
-        while self.isPlaying() and not self.isPlayingVideo() and not self.isPlayingAudio() and not util.MONITOR.abortRequested() and not self._closed:
-            util.MONITOR.waitForAbort(0.1)
+        while self.isPlaying() and not self.isPlayingVideo() and not self.isPlayingAudio():
+            if self._wait(MONITOR_MAX_WAIT):
+                break
 
         if not self.isPlayingVideo() and not self.isPlayingAudio():
             self.onPlayBackFailed()
 
+    def _nextWait(self, nextTick, poll=None):
+        """
+        Seconds until the next thing we have to do: poll the UI state, tick the handler or hit a marker boundary.
+        Returns (wait, tick at the end of the wait).
+        """
+        wait = nextTick - time.time()
+        if poll is not None:
+            wait = min(wait, poll)
+
+        deadline = not self.paused and self.handler.nextDeadline() or None
+        if deadline is not None and deadline < wait:
+            return max(deadline, MONITOR_MIN_WAIT), True
+
+        return wait, False
+
+    def _updateVideoUI(self, hasFullScreened):
+        # Try the state we expect in a single check first, only look at the details if something changed
+        expected = ' + '.join((
+            self.hasOSD and 'Window.IsActive(videoosd)' or '!Window.IsActive(videoosd)',
+            self.hasSeekOSD and 'Window.IsActive(seekbar)' or '!Window.IsActive(seekbar)',
+            hasFullScreened and 'VideoPlayer.IsFullscreen' or '!VideoPlayer.IsFullscreen'
+        ))
+        if self._condition(expected, skips=2):
+            return hasFullScreened
+
+        if self._condition('Window.IsActive(videoosd)'):
+            if not self.hasOSD:
+                self.hasOSD = True
+                self.onVideoOSD()
+        else:
+            self.hasOSD = False
+
+        if self._condition('Window.IsActive(seekbar)'):
+            if not self.hasSeekOSD:
+                self.hasSeekOSD = True
+                self.onSeekOSD()
+        else:
+            self.hasSeekOSD = False
+
+        if self._condition('VideoPlayer.IsFullscreen'):
+            if not hasFullScreened:
+                hasFullScreened = True
+                self.onVideoWindowOpened()
+        elif hasFullScreened and not self._condition('Window.IsVisible(busydialog)'):
+            hasFullScreened = False
+            self.onVideoWindowClosed()
+
+        return hasFullScreened
+
     def _videoMonitor(self):
         hasFullScreened = False
 
-        ct = 0
+        nextTick = time.time() + MONITOR_TICK_INTERVAL
         while self.isPlayingVideo() and not util.MONITOR.abortRequested() and not self._closed:
             self.currentTime = self.getTime()
-            util.MONITOR.waitForAbort(0.1)
-            if xbmc.getCondVisibility('Window.IsActive(videoosd)'):
-                if not self.hasOSD:
-                    self.hasOSD = True
-                    self.onVideoOSD()
-            else:
-                self.hasOSD = False
+            wait, atDeadline = self._nextWait(nextTick, self.paused and MONITOR_UI_POLL_PAUSED or MONITOR_UI_POLL)
+            waitUntil = time.time() + wait
+            if self._wait(wait):
+                break
 
-            if xbmc.getCondVisibility('Window.IsActive(seekbar)'):
-                if not self.hasSeekOSD:
-                    self.hasSeekOSD = True
-                    self.onSeekOSD()
-            else:
-                self.hasSeekOSD = False
-
-            if xbmc.getCondVisibility('VideoPlayer.IsFullscreen'):
-                if not hasFullScreened:
-                    hasFullScreened = True
-                    self.onVideoWindowOpened()
-            elif hasFullScreened and not xbmc.getCondVisibility('Window.IsVisible(busydialog)'):
-                hasFullScreened = False
-                self.onVideoWindowClosed()
-
-            ct += 1
-            if ct > 9:
-                ct = 0
+            hasFullScreened = self._updateVideoUI(hasFullScreened)
+
+            now = time.time()
+            if now >= nextTick or (atDeadline and now >= waitUntil):
+                nextTick = time.time() + MONITOR_TICK_INTERVAL
                 self.handler.tick()
 
         if hasFullScreened:
@@ -1201,21 +1533,33 @@ class PlexPlayer(xbmc.Player, signalsmixin.SignalsMixin):
     def _audioMonitor(self):
         self.started = True
         self.handler.onMonitorInit()
-        ct = 0
+
+        nextTick = time.time() + MONITOR_TICK_INTERVAL
         while self.isPlayingAudio() and not util.MONITOR.abortRequested() and not self._closed:
             self.currentTime = self.getTime()
-            util.MONITOR.waitForAbort(0.1)
+            if self._wait(self._nextWait(nextTick)[0]):
+                break
 
-            ct += 1
-            if ct > 9:
-                ct = 0
+            if time.time() >= nextTick:
+                nextTick = time.time() + MONITOR_TICK_INTERVAL
                 self.handler.tick()
 
 
+def publishConnection(server):
+    """
+    Lets plugin.py know which connection we currently use for a server, so tracks queued before the
+    connection changed still resolve to a reachable address.
+    """
+    if server and server.uuid and server.activeConnection:
+        util.setGlobalProperty('connection.{0}'.format(server.uuid), server.activeConnection.address)
+
+
 def shutdown():
     global PLAYER
+    PREPARER.invalidate()
     PLAYER.close(shutdown=True)
     del PLAYER
 
 
+PREPARER = PlaybackPreparer()
 PLAYER = PlexPlayer().init()
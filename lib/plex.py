@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import os
 import sys
 import platform
 import uuid
@@ -10,7 +11,7 @@ import six
 
 from kodi_six import xbmc
 
-from plexnet import plexapp, myplex, util as plexnet_util
+from plexnet import plexapp, myplex, metadatacache, util as plexnet_util
 from . import util
 from six.moves import range
 
@@ -83,10 +84,11 @@ class PlexInterface(plexapp.AppInterface):
         'provides': 'player',
         'device': util.getPlatform() or plexapp.PLATFORM,
         'model': 'Unknown',
-        'friendlyName': util.rpc.Settings.GetSettingValue(setting='services.devicename').get('value') or 'Kodi',
+        'friendlyName': util.KODI_SETTINGS.get('services.devicename') or 'Kodi',
         'supports1080p60': True,
         'vp9Support': True,
         'audioChannels': '2.0',
+        'metadataCachePath': os.path.join(util.PROFILE, 'metadata_cache'),
         'transcodeVideoQualities': [
             "10", "20", "30", "30", "40", "60", "60", "75", "100", "60", "75", "90", "100", "100"
         ],
@@ -153,8 +155,9 @@ class PlexInterface(plexapp.AppInterface):
             maxres = self.getPreference('allow_4k', True) and plexapp.Res((3840, 2160)) or plexapp.Res((1920, 1080))
             self._globals['transcodeVideoResolutions'][-5:] = [maxres] * 5
         elif glbl == 'audioChannels':
-            self._globals['audioChannels'] = \
-                util.CHANNELMAPPING[util.rpc.Settings.GetSettingValue(setting='audiooutput.channels').get('value')]
+            channels = util.KODI_SETTINGS.get('audiooutput.channels')
+            if channels in util.CHANNELMAPPING:
+                self._globals['audioChannels'] = util.CHANNELMAPPING[channels]
 
         return self._globals.get(glbl, default)
 
@@ -237,6 +240,7 @@ class PlexInterface(plexapp.AppInterface):
 
 
 plexapp.util.setInterface(PlexInterface())
+util.MONITOR.on('changed.watchstatus', metadatacache.CACHE.onWatchStatusChanged)
 plexapp.setUserAgent(defaultUserAgent())
 
 
@@ -285,6 +289,9 @@ class CallbackEvent(plexapp.util.CompatEvent):
 def init():
     util.DEBUG_LOG('Initializing...')
 
+    # Playback decisions need this, have it ready before anything gets played
+    util.KODI_SETTINGS.preload('audiooutput.channels')
+
     with CallbackEvent(plexapp.util.APP, 'init'):
         plexapp.init()
         util.DEBUG_LOG('Waiting for account initialization...')
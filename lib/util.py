@@ -28,6 +28,7 @@ _SHUTDOWN = False
 ADDON = xbmcaddon.Addon()
 
 SETTINGS_LOCK = threading.Lock()
+KODI_SETTINGS_TTL = 60  # seconds before a cached Kodi setting is refreshed in the background
 
 _splitver = xbmc.getInfoLabel('System.BuildVersion').split()[0].split(".")
 KODI_VERSION_MAJOR, KODI_VERSION_MINOR = int(_splitver[0].split("-")[0]), int(_splitver[1].split("-")[0])
@@ -54,7 +55,13 @@ class UtilityMonitor(xbmc.Monitor, signalsmixin.SignalsMixin):
     def watchStatusChanged(self):
         self.trigger('changed.watchstatus')
 
+    def onSettingsChanged(self):
+        SETTINGS_CACHE.invalidate()
+
     def onNotification(self, sender, method, data):
+        if 'audiooutput' in method.lower() or 'audiooutput' in (data or '').lower():
+            KODI_SETTINGS.invalidate('audiooutput.')
+
         if sender == 'script.plexmod' and method.endswith('RESTORE'):
             from .windows import kodigui
             getAdvancedSettings()
@@ -92,10 +99,130 @@ def LOG(msg, level=xbmc.LOGINFO):
     xbmc.log('script.plex: {0}'.format(msg), level)
 
 
+class SettingsCache(object):
+    """
+    Snapshot of the add-on's raw setting values, so hot paths don't go through ADDON.getSetting() and
+    SETTINGS_LOCK every time. Writes through setSetting() update it, anything else changing the settings
+    makes Kodi call UtilityMonitor.onSettingsChanged(), which drops the snapshot.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.values:
+                self.hits += 1
+                return self.values[key]
+            generation = self.generation
+
+        with SETTINGS_LOCK:
+            value = ADDON.getSetting(key)
+
+        with self.lock:
+            self.misses += 1
+            # Don't keep a value that was read while the settings changed
+            if generation == self.generation:
+                self.values[key] = value
+
+        return value
+
+    def set(self, key, value):
+        with self.lock:
+            if self.values.get(key) != value:
+                # generation also tells others (e.g. prepared playback) that settings changed
+                self.generation += 1
+            self.values[key] = value
+
+    def invalidate(self):
+        with self.lock:
+            self.values = {}
+            self.generation += 1
+
+    def getStats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class KodiSettingsCache(object):
+    """
+    Caches Kodi settings read through JSON-RPC (Settings.GetSettingValue). Only the first read of a setting
+    waits for Kodi; afterwards the cached value is returned right away and refreshed in the background once
+    it's older than KODI_SETTINGS_TTL, or when Kodi notifies us about a change.
+    """
+    def __init__(self, ttl=KODI_SETTINGS_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.values = {}
+        self.refreshing = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _fetch(self, setting):
+        value = rpc.Settings.GetSettingValue(setting=setting).get('value')
+        with self.lock:
+            self.values[setting] = (value, time.time())
+            self.refreshing.discard(setting)
+        return value
+
+    def _refresh(self, setting):
+        try:
+            self._fetch(setting)
+        except:
+            with self.lock:
+                self.refreshing.discard(setting)
+            ERROR()
+
+    def _startRefresh(self, setting):
+        # must be called with self.lock held
+        if setting in self.refreshing:
+            return
+        self.refreshing.add(setting)
+        thread = threading.Thread(target=self._refresh, args=(setting,), name='settings.refresh')
+        thread.daemon = True
+        thread.start()
+
+    def get(self, setting, default=None):
+        with self.lock:
+            cached = self.values.get(setting)
+            if cached:
+                self.hits += 1
+                if time.time() - cached[1] > self.ttl:
+                    self._startRefresh(setting)
+                return cached[0]
+
+            self.misses += 1
+
+        try:
+            return self._fetch(setting)
+        except:
+            ERROR()
+            return default
+
+    def preload(self, *settings):
+        with self.lock:
+            for setting in settings:
+                if setting not in self.values:
+                    self._startRefresh(setting)
+
+    def invalidate(self, prefix=''):
+        with self.lock:
+            for setting in self.values:
+                if setting.startswith(prefix):
+                    self._startRefresh(setting)
+
+    def getStats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+SETTINGS_CACHE = SettingsCache()
+KODI_SETTINGS = KodiSettingsCache()
+
+
 def getSetting(key, default=None):
-    with SETTINGS_LOCK:
-        setting = ADDON.getSetting(key)
-        return _processSetting(setting, default)
+    return _processSetting(SETTINGS_CACHE.get(key), default)
 
 
 def _processSetting(setting, default):
@@ -139,6 +266,7 @@ class AdvancedSettings(object):
         ("skip_intro_button_timeout", 10),
         ("skip_credits_button_timeout", 10),
         ("playlist_visit_media", True),
+        ("photo_prefetch_count", 3),
         ("intro_skip_early", False),
         ("show_media_ends_info", False),
         ("background_colour", None)
@@ -200,6 +328,7 @@ def setSetting(key, value):
     with SETTINGS_LOCK:
         value = _processSettingForWrite(value)
         ADDON.setSetting(key, value)
+        SETTINGS_CACHE.set(key, value)
 
 
 def _processSettingForWrite(value):
@@ -424,17 +553,11 @@ def timeInDayLocalSeconds():
 
 
 def getKodiSkipSteps():
-    try:
-        return rpc.Settings.GetSettingValue(setting="videoplayer.seeksteps")["value"]
-    except:
-        return
+    return KODI_SETTINGS.get("videoplayer.seeksteps")
 
 
 def getKodiSlideshowInterval():
-    try:
-        return rpc.Settings.GetSettingValue(setting="slideshow.staytime")["value"]
-    except:
-        return 3
+    return KODI_SETTINGS.get("slideshow.staytime", 3)
 
 
 kodiSkipSteps = getKodiSkipSteps()
@@ -649,6 +772,7 @@ def garbageCollect():
 
 def shutdown():
     global MONITOR, ADDON, T, _SHUTDOWN
+    DEBUG_LOG('Settings cache: Add-on settings {0}, Kodi settings {1}'.format(SETTINGS_CACHE.getStats(), KODI_SETTINGS.getStats()))
     _SHUTDOWN = True
     del MONITOR
     del T
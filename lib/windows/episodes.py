@@ -9,7 +9,7 @@ from lib import backgroundthread
 from lib import metadata
 from lib import player
 
-from plexnet import plexapp, playlist, plexplayer
+from plexnet import plexapp, playlist, plexplayer, metadatabatch, metadatacache
 
 from . import busy
 from . import videoplayer
@@ -31,8 +31,8 @@ VIDEO_RELOAD_KW = dict(includeExtras=1, includeExtrasCount=10, includeChapters=1
 
 
 class EpisodeReloadTask(backgroundthread.Task):
-    def setup(self, episode, callback):
-        self.episode = episode
+    def setup(self, episodes, callback):
+        self.episodes = episodes
         self.callback = callback
         return self
 
@@ -45,10 +45,12 @@ class EpisodeReloadTask(backgroundthread.Task):
             return
 
         try:
-            self.episode.reload(checkFiles=1, includeChapters=1)
-            if self.isCanceled():
-                return
-            self.callback(self.episode)
+            # one request for all of them
+            metadatabatch.reloadItems(self.episodes, checkFiles=1, includeChapters=1)
+            for episode in self.episodes:
+                if self.isCanceled():
+                    return
+                self.callback(episode)
         except:
             util.ERROR()
 
@@ -231,6 +233,7 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.initialized = False
 
     def doClose(self):
+        plexapp.util.APP.off('metadata:updated', self.onMetadataUpdated)
         self.episodesPaginator = None
         self.relatedPaginator = None
         kodigui.ControlledWindow.doClose(self)
@@ -251,6 +254,7 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
 
         self._setup()
         self.postSetup()
+        plexapp.util.APP.on('metadata:updated', self.onMetadataUpdated)
 
     def doAutoPlay(self):
         # First reload the video to get all the other info
@@ -970,16 +974,30 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.reloadItems(items)
 
     def reloadItems(self, items):
-        tasks = []
-        for mli in items:
-            if not mli.dataSource:
-                continue
+        episodes = [mli.dataSource for mli in items if mli.dataSource]
+        if not episodes:
+            return
 
-            task = EpisodeReloadTask().setup(mli.dataSource, self.reloadItemCallback)
-            self.tasks.add(task)
-            tasks.append(task)
+        task = EpisodeReloadTask().setup(episodes, self.reloadItemCallback)
+        self.tasks.add(task)
+        backgroundthread.BGThreader.addTask(task)
 
-        backgroundthread.BGThreader.addTasks(tasks)
+    def onMetadataUpdated(self, server=None, path=None, **kwargs):
+        # Episodes were shown from the metadata cache, the server has since sent something newer for some of them
+        if not self.initialized or not self.tasks:
+            return
+
+        keys = metadatacache.itemKeys(path or '')
+        if not keys:
+            return
+
+        items = [
+            mli for mli in self.episodeListControl
+            if mli.dataSource and str(mli.dataSource.ratingKey) in keys and mli.dataSource.getServer() == server
+        ]
+        if items:
+            util.DEBUG_LOG('Episodes: {0} episodes changed on the server - refreshing'.format(len(items)))
+            self.reloadItems(items)
 
     def reloadItemCallback(self, episode):
         selected = self.episodeListControl.getSelectedItem()
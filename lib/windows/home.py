@@ -13,7 +13,7 @@ from lib import colors
 from lib import player
 
 import plexnet
-from plexnet import plexapp
+from plexnet import plexapp, plexlibrary, notifications
 
 from . import windowutils
 from . import playlists
@@ -26,9 +26,19 @@ from lib.util import T
 from six.moves import range
 
 
-HUBS_REFRESH_INTERVAL = 300  # 5 Minutes
+HUBS_REFRESH_INTERVAL = 300  # 5 Minutes, only while the server's notifications aren't available
 HUB_PAGE_SIZE = 10
 
+# Hubs listing the newest items of a section, refreshed when the server reports new or deleted items
+RECENTLY_ADDED_HUBS = frozenset((
+    'home.television.recent', 'home.movies.recent', 'home.music.recent', 'home.videos.recent', 'home.photos.recent',
+    'tv.recentlyadded', 'movie.recentlyadded', 'music.recent.added', 'photo.recent', 'video.recent'
+))
+HUB_REFRESH_DELAY = 500  # ms to collect change notifications before refreshing the affected hubs
+TIMELINE_STATE_DONE = 5  # the item has been fully processed
+TIMELINE_STATE_DELETED = 9
+SECTION_HUBS_PATH = re.compile(r'^/hubs(?:/sections/(\w+))?/?(?:\?|$)')  # group 1: the section key, None for home
+
 MOVE_SET = frozenset(
     (
         xbmcgui.ACTION_MOVE_LEFT,
@@ -47,11 +57,54 @@ MOVE_SET = frozenset(
 
 
 class HubsList(list):
+    requestTime = None
+
     def init(self):
         self.lastUpdated = time.time()
         return self
 
 
+class SectionsTask(backgroundthread.Task):
+    section = None  # lives in HomeWindow.tasks next to the SectionHubsTasks
+
+    def setup(self, server, callback):
+        self.server = server
+        self.callback = callback
+        self.playlists = None
+        return self
+
+    def fetchPlaylists(self):
+        try:
+            self.playlists = self.server.playlists()
+        except Exception:
+            util.ERROR()
+
+    def run(self):
+        if self.isCanceled():
+            return
+
+        # Playlists and sections don't depend on each other, so fetch them side by side
+        start = time.time()
+        thread = threading.Thread(target=self.fetchPlaylists, name='home.playlists')
+        thread.start()
+
+        try:
+            # The library container itself isn't needed for the section list, skip the extra /library/ request
+            sections = plexlibrary.Library(None, server=self.server).sections()
+        except plexnet.exceptions.BadRequest:
+            sections = None
+        except Exception:
+            util.ERROR()
+            sections = []
+
+        thread.join()
+        if self.isCanceled():
+            return
+
+        util.DEBUG_LOG('Home: Sections and playlists loaded in {0:.2f}s'.format(time.time() - start))
+        self.callback(self.server, self.playlists, sections)
+
+
 class SectionHubsTask(backgroundthread.Task):
     def setup(self, section, callback):
         self.section = section
@@ -67,7 +120,12 @@ class SectionHubsTask(backgroundthread.Task):
             return
 
         try:
+            start = time.time()
             hubs = HubsList(plexapp.SERVERMANAGER.selectedServer.hubs(self.section.key, count=HUB_PAGE_SIZE)).init()
+            hubs.requestTime = hubs.lastUpdated - start
+            util.DEBUG_LOG('Home: {0} hubs for section {1} loaded in {2:.2f}s'.format(
+                len(hubs), repr(self.section.title), hubs.requestTime)
+            )
             if self.isCanceled():
                 return
             self.callback(self.section, hubs)
@@ -303,6 +361,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
 
     def __init__(self, *args, **kwargs):
         kodigui.BaseWindow.__init__(self, *args, **kwargs)
+        self.startedAt = kwargs.get('started_at')
         self.lastSection = HomeSection
         self.tasks = []
         self.closeOption = None
@@ -314,6 +373,11 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
         self.lastNonOptionsFocusID = None
         self.sectionHubs = {}
         self.updateHubs = {}
+        self.hubLatencies = {}
+        self.hubLoadStart = None
+        self.notifications = notifications.NotificationListener()
+        self.pendingHubRefresh = {}
+        self.hubRefreshTimer = None
         windowutils.HOME = self
 
         self.lock = threading.Lock()
@@ -361,6 +425,9 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
         self.hookSignals()
         util.CRON.registerReceiver(self)
 
+        if self.startedAt:
+            util.DEBUG_LOG('Home: Cold start to home took {0:.2f}s'.format(time.time() - self.startedAt))
+
     def onReInit(self):
         if self.lastFocusID:
             # try focusing the last focused ID. if that's a hub and it's empty (=not focusable), try focusing the
@@ -409,10 +476,15 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
 
         plexapp.util.APP.on('change:selectedServer', self.onSelectedServerChange)
         plexapp.util.APP.on('account:response', self.displayServerAndUser)
+        plexapp.util.APP.on('metadata:updated', self.onMetadataUpdated)
 
-        player.PLAYER.on('session.ended', self.updateOnDeckHubs)
+        player.PLAYER.on('session.ended', self.onSessionEnded)
         util.MONITOR.on('changed.watchstatus', self.updateOnDeckHubs)
 
+        self.notifications.on('timeline', self.onTimelineNotification)
+        self.notifications.on('activity', self.onActivityNotification)
+        self.notifications.on('playing', self.onPlayingNotification)
+
     def unhookSignals(self):
         plexapp.SERVERMANAGER.off('new:server', self.onNewServer)
         plexapp.SERVERMANAGER.off('remove:server', self.onRemoveServer)
@@ -420,10 +492,19 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
 
         plexapp.util.APP.off('change:selectedServer', self.onSelectedServerChange)
         plexapp.util.APP.off('account:response', self.displayServerAndUser)
+        plexapp.util.APP.off('metadata:updated', self.onMetadataUpdated)
 
-        player.PLAYER.off('session.ended', self.updateOnDeckHubs)
+        player.PLAYER.off('session.ended', self.onSessionEnded)
         util.MONITOR.off('changed.watchstatus', self.updateOnDeckHubs)
 
+        self.notifications.off(None, None)
+        self.notifications.stop()
+
+        with self.lock:
+            if self.hubRefreshTimer:
+                self.hubRefreshTimer.cancel()
+                self.hubRefreshTimer = None
+
     def tick(self):
         if not self.lastSection:
             return
@@ -432,6 +513,10 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
         if not hubs:
             return
 
+        if self.notifications.isConnected():
+            # The server tells us what changed
+            return
+
         if time.time() - hubs.lastUpdated > HUBS_REFRESH_INTERVAL:
             self.showHubs(self.lastSection, update=True)
 
@@ -576,9 +661,140 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
         self.processCommand(search.dialog(self))
 
     def updateOnDeckHubs(self, **kwargs):
-        tasks = [UpdateHubTask().setup(hub, self.updateHubCallback) for hub in self.updateHubs.values()]
-        self.tasks += tasks
-        backgroundthread.BGThreader.addTasks(tasks)
+        self.refreshHubs(list(self.updateHubs.values()))
+
+    def onSessionEnded(self, **kwargs):
+        if self.notifications.isConnected():
+            # The server's playing notification takes care of this
+            return
+
+        self.updateOnDeckHubs()
+
+    def refreshHubs(self, hubs):
+        # Changes tend to come in bursts (library scans, several items marked watched), refresh once per burst
+        with self.lock:
+            for hub in hubs:
+                self.pendingHubRefresh[id(hub)] = hub
+
+            if self.hubRefreshTimer or not self.pendingHubRefresh:
+                return
+
+            self.hubRefreshTimer = plexapp.createTimer(HUB_REFRESH_DELAY, self.onHubRefreshTimer)
+            plexapp.util.APP.addTimer(self.hubRefreshTimer)
+
+    def onHubRefreshTimer(self):
+        with self.lock:
+            hubs = list(self.pendingHubRefresh.values())
+            self.pendingHubRefresh = {}
+            self.hubRefreshTimer = None
+
+            self.cleanTasks()
+            # A hub that's still waiting in the queue will fetch the current state anyway
+            queued = set(id(t.hub) for t in self.tasks if isinstance(t, UpdateHubTask) and t.isQueued())
+            tasks = [UpdateHubTask().setup(hub, self.updateHubCallback) for hub in hubs if id(hub) not in queued]
+            if not tasks:
+                return
+
+            util.DEBUG_LOG('Refreshing hubs: {0}'.format(', '.join(t.hub.hubIdentifier for t in tasks)))
+            self.tasks += tasks
+            backgroundthread.BGThreader.addTasksToFront(tasks)
+
+    def onMetadataUpdated(self, server=None, path=None, **kwargs):
+        """
+        The hubs of a section were shown from the metadata cache and the server has since answered with
+        newer ones: reload the section if it's on screen, otherwise the next time it's shown.
+        """
+        match = SECTION_HUBS_PATH.match(path or '')
+        if not match or server != plexapp.SERVERMANAGER.selectedServer:
+            return
+
+        with self.lock:
+            for mli in self.sectionList:
+                section = mli.dataSource
+                if not section or (section.key and str(section.key)) != match.group(1):
+                    continue
+
+                hubs = self.sectionHubs.get(section.key)
+                if not hubs:
+                    return
+
+                if section != self.lastSection:
+                    hubs.lastUpdated = 0
+                    return
+
+                util.DEBUG_LOG('Hubs of section {0} changed on the server - refreshing'.format(repr(section.title)))
+                self.cleanTasks()
+                self.tasks.append(SectionHubsTask().setup(section, self.sectionHubsCallback))
+                backgroundthread.BGThreader.addTasksToFront([self.tasks[-1]])
+                return
+
+    def onContentChanged(self, sectionIDs, ratingKeys=()):
+        """
+        Refreshes the hubs on screen that list one of the items or the newest items of one of the sections.
+        Hubs of other sections are marked stale, so they're reloaded once they're shown again.
+        """
+        refresh = []
+        with self.lock:
+            current = self.lastSection
+            for mli in self.sectionList:
+                section = mli.dataSource
+                if not section:
+                    continue
+
+                hubs = self.sectionHubs.get(section.key)
+                if not hubs:
+                    continue
+
+                affected = bool(sectionIDs) and (section.key is None or str(section.key) in sectionIDs)
+                if section != current:
+                    if affected:
+                        hubs.lastUpdated = 0
+                    continue
+
+                for hub in hubs:
+                    if affected and hub.getCleanHubIdentifier() in RECENTLY_ADDED_HUBS:
+                        refresh.append(hub)
+                    elif ratingKeys and any(str(item.get('ratingKey')) in ratingKeys for item in hub.items):
+                        refresh.append(hub)
+
+        if refresh:
+            self.refreshHubs(refresh)
+
+    def onTimelineNotification(self, server=None, entries=None, **kwargs):
+        sectionIDs = set()
+        ratingKeys = set()
+        for entry in entries or ():
+            if entry.get('state') not in (TIMELINE_STATE_DONE, TIMELINE_STATE_DELETED):
+                continue
+
+            # Only items that are already known to the library (metadataState unset) can be listed in a hub
+            if entry.get('itemID') and not entry.get('metadataState'):
+                ratingKeys.add(str(entry['itemID']))
+
+            if entry.get('sectionID') not in (None, '-1', -1):
+                sectionIDs.add(str(entry['sectionID']))
+
+        if sectionIDs or ratingKeys:
+            self.onContentChanged(sectionIDs, ratingKeys)
+
+    def onActivityNotification(self, server=None, activities=None, **kwargs):
+        sectionIDs = set()
+        for notification in activities or ():
+            activity = notification.get('Activity') or {}
+            if notification.get('event') != 'ended' or not activity.get('type', '').startswith('library.'):
+                continue
+
+            sectionID = (activity.get('Context') or {}).get('librarySectionID')
+            if sectionID:
+                sectionIDs.add(str(sectionID))
+
+        if sectionIDs:
+            self.onContentChanged(sectionIDs)
+
+    def onPlayingNotification(self, server=None, sessions=None, **kwargs):
+        # Progress only matters to the on deck/in progress hubs once playback paused or stopped
+        if any(session.get('state') in ('paused', 'stopped') for session in sessions or ()):
+            self.updateOnDeckHubs()
 
     def showBusy(self, on=True):
         self.setProperty('busy', on and '1' or '')
@@ -594,9 +810,11 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
             self.setProperty('hub.focus', '')
             self.displayServerAndUser()
             if not plexapp.SERVERMANAGER.selectedServer:
+                self.notifications.stop()
                 self.setFocusId(self.USER_BUTTON_ID)
                 return False
 
+            self.notifications.start(plexapp.SERVERMANAGER.selectedServer)
             self.showSections()
             self.backgroundSet = False
             self.showHubs(HomeSection)
@@ -756,6 +974,25 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
 
     def showSections(self):
         self.sectionHubs = {}
+        self.hubLatencies = {}
+        self.hubLoadStart = time.time()
+
+        # Show the home section right away, the rest of the list fills in once the server answered
+        self.lastSection = HomeSection
+        self.bottomItem = 0
+        self.sectionList.reset()
+        self.sectionList.addItems(self.createSectionItems())
+        self.setFocusId(self.SECTION_LIST_ID)
+
+        server = plexapp.SERVERMANAGER.selectedServer
+        self.tasks = [SectionsTask().setup(server, self.sectionsCallback)]
+        if server.hasHubs():
+            # The home section has the focus, so its hubs go first
+            self.tasks.insert(0, SectionHubsTask().setup(HomeSection, self.sectionHubsCallback))
+
+        backgroundthread.BGThreader.addTasksToFront(self.tasks)
+
+    def createSectionItems(self, playlists=None, sections=()):
         items = []
 
         homemli = kodigui.ManagedListItem(T(32332, 'Home'), data_source=HomeSection)
@@ -763,43 +1000,55 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
         homemli.setProperty('item', '1')
         items.append(homemli)
 
-        pl = plexapp.SERVERMANAGER.selectedServer.playlists()
-        if pl:
+        if playlists:
             plli = kodigui.ManagedListItem('Playlists', thumbnailImage='script.plex/home/type/playlists.png', data_source=PlaylistsSection)
             plli.setProperty('is.playlists', '1')
             plli.setProperty('item', '1')
             items.append(plli)
 
-        try:
-            sections = plexapp.SERVERMANAGER.selectedServer.library.sections()
-        except plexnet.exceptions.BadRequest:
-            self.setFocusId(self.SERVER_BUTTON_ID)
-            util.messageDialog("Error", "Bad request")
-            return
-
-        if plexapp.SERVERMANAGER.selectedServer.hasHubs():
-            self.tasks = [SectionHubsTask().setup(s, self.sectionHubsCallback) for s in [HomeSection, PlaylistsSection] + sections]
-            backgroundthread.BGThreader.addTasks(self.tasks)
-
         for section in sections:
             mli = kodigui.ManagedListItem(section.title, thumbnailImage='script.plex/home/type/{0}.png'.format(section.type), data_source=section)
             mli.setProperty('item', '1')
             items.append(mli)
 
-        self.bottomItem = len(items) - 1
-
         for x in range(len(items), 8):
             mli = kodigui.ManagedListItem()
             items.append(mli)
 
-        self.lastSection = HomeSection
-        self.sectionList.reset()
-        self.sectionList.addItems(items)
+        return items
 
-        if items:
-            self.setFocusId(self.SECTION_LIST_ID)
-        else:
+    def sectionsCallback(self, server, playlists, sections):
+        if server != plexapp.SERVERMANAGER.selectedServer:
+            return
+
+        if sections is None:
             self.setFocusId(self.SERVER_BUTTON_ID)
+            util.messageDialog("Error", "Bad request")
+            return
+
+        with self.lock:
+            items = self.createSectionItems(playlists, sections)
+            self.bottomItem = (playlists and 1 or 0) + len(sections)
+            self.sectionList.replaceItems(items)
+
+            if server.hasHubs():
+                tasks = [SectionHubsTask().setup(s, self.sectionHubsCallback) for s in [PlaylistsSection] + sections]
+                self.cleanTasks()
+                self.tasks += tasks
+                backgroundthread.BGThreader.addTasks(tasks)
+
+    def recordHubLatency(self, hub, hubs):
+        if self.hubLoadStart is None:
+            return
+
+        latency = time.time() - self.hubLoadStart
+        if not self.hubLatencies:
+            util.DEBUG_LOG('Home: Time to first hub: {0:.2f}s'.format(latency))
+
+        self.hubLatencies[hub.hubIdentifier] = latency
+        util.DEBUG_LOG('Home: Hub {0} shown after {1:.2f}s (request: {2:.2f}s)'.format(
+            hub.hubIdentifier, latency, hubs.requestTime or 0)
+        )
 
     def showHubs(self, section=None, update=False):
         self.setBoolProperty('no.content', False)
@@ -831,7 +1080,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
 
         if not hubs:
             for task in self.tasks:
-                if task.section == section:
+                if isinstance(task, SectionHubsTask) and task.section == section:
                     backgroundthread.BGThreader.moveToFront(task)
                     break
 
@@ -866,9 +1115,16 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
                 if self.showHub(hub):
                     if hub.items:
                         hasContent = True
+                        if not update:
+                            self.recordHubLatency(hub, hubs)
                     if self.HUBMAP[identifier].get('do_updates'):
                         self.updateHubs[identifier] = hub
 
+            if self.hubLoadStart is not None and not update:
+                # Only the first section shown after a refresh tells us how long the user had to wait
+                util.DEBUG_LOG('Home: {0} hubs shown after {1:.2f}s'.format(len(self.hubLatencies), time.time() - self.hubLoadStart))
+                self.hubLoadStart = None
+
             if not hasContent:
                 self.setBoolProperty('no.content', True)
 
@@ -1115,6 +1371,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver):
         self.onNewServer()
 
     def onReachableServer(self, server=None, **kwargs):
+        player.publishConnection(server)
         for mli in self.serverList:
             if mli.dataSource == server:
                 return
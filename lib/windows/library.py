@@ -5,6 +5,7 @@ import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
 import json
 import time
 import threading
+from collections import OrderedDict
 
 from kodi_six import xbmc
 from kodi_six import xbmcgui
@@ -25,6 +26,7 @@ from . import opener
 from . import windowutils
 
 from plexnet import playqueue
+from plexnet import plexapp
 
 from lib.util import T
 import six
@@ -33,6 +35,10 @@ from six.moves import range
 CHUNK_SIZE = 200
 # CHUNK_SIZE = 30
 
+PAGE_CACHE_MAX_ITEMS = 2000  # library items kept in memory across all cached pages
+PAGE_CACHE_TTL = 300
+PAGE_CACHE_WAIT_INTERVAL = 0.5  # seconds between cancel checks while waiting for someone else's request
+
 KEYS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
 MOVE_SET = frozenset(
@@ -167,6 +173,106 @@ def setItemType(type_=None):
     util.setGlobalProperty('item.type', str(ITEM_TYPE))
 
 
+class PageCache(object):
+    """
+    In-memory cache for library chunks, so scrolling back and forth or jumping around doesn't fetch the same
+    pages again. Concurrent requests for the same page share a single request to the server. The least recently
+    used pages are dropped once more than PAGE_CACHE_MAX_ITEMS items are cached.
+    """
+
+    def __init__(self, maxItems=PAGE_CACHE_MAX_ITEMS, ttl=PAGE_CACHE_TTL):
+        self.maxItems = maxItems
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.pages = OrderedDict()  # key: (stored, items), least recently used first
+        self.inFlight = {}
+        self.size = 0
+        self.generation = 0
+        self.requests = 0
+        self.served = 0
+
+    def get(self, key, fetch, isCanceled=None):
+        """
+        Returns the page for key, calling fetch() if it isn't cached, or None if isCanceled() turned True
+        while waiting for another request for the same page.
+        """
+        shared = True
+        while True:
+            with self.lock:
+                entry = self.pages.get(key)
+                if entry and time.time() - entry[0] < self.ttl:
+                    self.pages[key] = self.pages.pop(key)
+                    self.served += 1
+                    return entry[1]
+
+                generation = self.generation
+                event = self.inFlight.get(key)
+                if not event:
+                    event = self.inFlight[key] = threading.Event()
+                    break
+
+            # Someone else is fetching this page, if that fails we'll try ourselves
+            while not event.wait(PAGE_CACHE_WAIT_INTERVAL):
+                if (isCanceled and isCanceled()) or util.MONITOR.abortRequested():
+                    return None
+
+                if self.generation != generation:
+                    # Invalidated meanwhile, that request's result won't be stored, don't wait for it
+                    generation = self.generation
+                    shared = False
+                    break
+
+            if not shared:
+                break
+
+        try:
+            items = fetch()
+        finally:
+            with self.lock:
+                self.requests += 1
+                if shared:
+                    del self.inFlight[key]
+            if shared:
+                event.set()
+
+        with self.lock:
+            self.served += 1
+            # don't store pages that were requested before the last invalidation, nor failed or cut off requests,
+            # the next request should try again instead of showing a blank chunk until the page expires
+            if generation == self.generation and items is not None and items.complete:
+                self._store(key, items)
+
+        return items
+
+    def _store(self, key, items):
+        old = self.pages.pop(key, None)
+        if old:
+            self.size -= len(old[1])
+
+        self.pages[key] = (time.time(), items)
+        self.size += len(items)
+
+        while self.size > self.maxItems and len(self.pages) > 1:
+            self.size -= len(self.pages.popitem(last=False)[1][1])
+
+    def invalidate(self, **kwargs):
+        with self.lock:
+            self.generation += 1
+            self.pages.clear()
+            self.size = 0
+
+    def getStats(self):
+        with self.lock:
+            return {'pages': len(self.pages), 'items': self.size, 'requests': self.requests, 'served': self.served}
+
+
+PAGE_CACHE = PageCache()
+
+# watch state and view offsets are part of the cached items
+util.MONITOR.on('changed.watchstatus', PAGE_CACHE.invalidate)
+player.PLAYER.on('session.ended', PAGE_CACHE.invalidate)
+
+
 class ChunkRequestTask(backgroundthread.Task):
     def setup(self, section, start, size, callback, filter_=None, sort=None, unwatched=False, subDir=False):
         self.section = section
@@ -195,10 +301,18 @@ class ChunkRequestTask(backgroundthread.Task):
             elif ITEM_TYPE == 'collection':
                 type_ = 18
 
+            # pages hold the user's watch state, home users must not see each other's
+            key = (
+                plexapp.ACCOUNT.ID, self.section.getServer().uuid, self.section.key, ITEM_TYPE, repr(self.filter), repr(self.sort),
+                self.unwatched, type_, self.subDir, self.start, self.size
+            )
+
             if ITEM_TYPE == 'folder':
-                items = self.section.folder(self.start, self.size, self.subDir)
+                items = PAGE_CACHE.get(key, lambda: self.section.folder(self.start, self.size, self.subDir), self.isCanceled)
             else:
-                items = self.section.all(self.start, self.size, self.filter, self.sort, self.unwatched, type_=type_)
+                items = PAGE_CACHE.get(key, lambda: self.section.all(
+                    self.start, self.size, self.filter, self.sort, self.unwatched, type_=type_
+                ), self.isCanceled)
 
             if self.isCanceled():
                 return
@@ -375,6 +489,63 @@ class ChunkModeWrapped(object):
             self.objects = self.objects[:CHUNK_SIZE * 2] + objects
 
 
+class ChunkModeVirtual(object):
+    """
+    Tracks which CHUNK_SIZE blocks of a flat (non-chunked) list are loaded.
+
+    Only the chunks around the focused position are kept filled; everything
+    else stays a bare placeholder. The window is skewed towards the direction
+    of travel so scrolling keeps finding loaded items ahead of it.
+    """
+    AHEAD = 2
+    BEHIND = 1
+    KEEP = 3
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, itemCount=0):
+        self.itemCount = itemCount
+        self.chunks = set()
+        self.lastStart = None
+        self.direction = 1
+
+    def chunkStart(self, pos):
+        return pos - pos % CHUNK_SIZE
+
+    def isWanted(self, start):
+        return start in self.chunks
+
+    def update(self, pos):
+        """
+        Returns (starts to request in priority order, starts to evict) for the focused position.
+        """
+        if not self.itemCount:
+            return [], []
+
+        current = self.chunkStart(min(max(pos, 0), self.itemCount - 1))
+        if self.lastStart is not None and current != self.lastStart:
+            self.direction = current > self.lastStart and 1 or -1
+        self.lastStart = current
+
+        step = CHUNK_SIZE * self.direction
+        order = [current]
+        order += [current + step * x for x in range(1, self.AHEAD + 1)]
+        order += [current - step * x for x in range(1, self.BEHIND + 1)]
+
+        request = []
+        for start in order:
+            if 0 <= start < self.itemCount and start not in self.chunks:
+                self.chunks.add(start)
+                request.append(start)
+
+        keep = CHUNK_SIZE * self.KEEP
+        evict = [start for start in self.chunks if abs(start - current) > keep]
+        self.chunks.difference_update(evict)
+
+        return request, evict
+
+
 class CustomScrollBar(object):
     def __init__(self, window, bar_group_id, bar_image_id, bar_image_focus_id, button_id, min_bar_height=20):
         self._barGroup = window.getControl(bar_group_id)
@@ -464,8 +635,12 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
         self.sortDesc = self.librarySettings.getSetting('sort.desc', False)
 
         self.chunkMode = None
+        self.virtualMode = None
+        self.virtualTasks = {}
         if ITEM_TYPE in ('episode', 'album'):
             self.chunkMode = ChunkModeWrapped()
+        else:
+            self.virtualMode = ChunkModeVirtual()
 
         key = self.section.key
         if not key.isdigit():
@@ -874,6 +1049,7 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
             if not mli:
                 return
             pos = mli.pos()
+            self.requestVirtualChunks(pos)
 
         self.showPanelControl.selectItem(pos)
         self.setFocusId(self.POSTERS_PANEL_ID)
@@ -1323,7 +1499,16 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
 
     def updateItem(self, mli=None):
         mli = mli or self.showPanelControl.getSelectedItem()
-        if not mli or mli.dataSource:
+        if not mli:
+            return
+
+        if self.virtualMode:
+            try:
+                self.requestVirtualChunks(int(mli.getProperty('index')))
+            except ValueError:
+                pass
+
+        if mli.dataSource:
             return
 
         for task in self.tasks:
@@ -1351,6 +1536,9 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
     def fill(self):
         if self.chunkMode:
             self.chunkMode.reset()
+        elif self.virtualMode:
+            self.cancelVirtualTasks()
+            self.virtualMode.reset()
 
         if self.section.TYPE in ('photo', 'photodirectory'):
             self.fillPhotos()
@@ -1393,6 +1581,7 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
 
         idx = 0
         fallback = 'script.plex/thumb_fallbacks/{0}.png'.format(TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie'])['fallback'])
+        self.thumbFallback = fallback
 
         if self.sort != 'titleSort' or ITEM_TYPE == 'folder' or self.subDir or self.section.TYPE == "collection":
             if ITEM_TYPE == 'folder':
@@ -1477,6 +1666,11 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
 
         self.showPanelControl.selectItem(0)
 
+        if self.virtualMode:
+            self.virtualMode.reset(totalSize)
+            self.requestVirtualChunks(0)
+            return
+
         tasks = []
         ct = 0
         for start in range(0, totalSize, CHUNK_SIZE):
@@ -1487,12 +1681,58 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
             )
             ct += 1
 
-            if self.chunkMode and ct > 1:
+            if ct > 1:
                 break
 
         self.tasks.add(tasks)
         backgroundthread.BGThreader.addTasksToFront(tasks)
 
+    def requestVirtualChunks(self, pos):
+        if not self.virtualMode:
+            return
+
+        with self.lock:
+            request, evict = self.virtualMode.update(pos)
+            for start in evict:
+                task = self.virtualTasks.pop(start, None)
+                if task:
+                    task.cancel()
+                self.evictChunk(start)
+
+        if not request:
+            return
+
+        tasks = []
+        for start in request:
+            task = ChunkRequestTask().setup(
+                self.section, start, CHUNK_SIZE, self.chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, subDir=self.subDir
+            )
+            self.virtualTasks[start] = task
+            tasks.append(task)
+
+        util.DEBUG_LOG('Requesting chunks {0} (evicted: {1})'.format(request, evict))
+        self.tasks.add(tasks)
+        backgroundthread.BGThreader.addTasksToFront(tasks)
+
+    def cancelVirtualTasks(self):
+        for task in self.virtualTasks.values():
+            task.cancel()
+        self.virtualTasks = {}
+
+    def evictChunk(self, start):
+        for pos in range(start, min(start + CHUNK_SIZE, self.showPanelControl.size())):
+            mli = self.showPanelControl[pos]
+            if not mli.dataSource:
+                continue
+
+            key = mli.getProperty('key')
+            mli.clear()
+            mli.dataSource = None
+            mli.setProperty('index', str(pos))
+            mli.setProperty('thumb.fallback', self.thumbFallback)
+            if key in self.keyItems:
+                mli.setProperty('key', key)
+
     def showPhotoItemProperties(self, photo):
         if photo.isFullObject():
             return
@@ -1633,6 +1873,12 @@ class LibraryWindow(kodigui.MultiWindow, windowutils.UtilMixin):
         with self.lock:
             if self.chunkMode and not self.chunkMode.posIsValid(start):
                 return
+
+            if self.virtualMode:
+                if not self.virtualMode.isWanted(start):
+                    return
+                self.virtualTasks.pop(start, None)
+
             pos = start
             self.setBackground(items, pos, randomize=not util.advancedSettings.dynamicBackgrounds)
 
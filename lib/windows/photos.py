@@ -6,6 +6,7 @@ import tempfile
 import shutil
 import hashlib
 import requests
+from collections import OrderedDict
 
 from kodi_six import xbmc, xbmcvfs
 from kodi_six import xbmcgui
@@ -13,9 +14,209 @@ from kodi_six import xbmcgui
 from . import kodigui
 from . import busy
 
-from lib import util, colors
+from lib import util, colors, backgroundthread
 from plexnet import plexapp, plexplayer, playqueue
 
+PREFETCH_WORKERS = 3
+PREFETCH_CHUNK_SIZE = 64 * 1024
+PREFETCH_TIMEOUT = 10.0
+PREFETCH_WAIT = 30  # seconds to wait for the current photo before giving up
+
+
+class PhotoPrefetchTask(backgroundthread.Task):
+    def setup(self, item, prefetcher):
+        self.item = item
+        self.prefetcher = prefetcher
+        self.result = None
+        self.done = threading.Event()
+        return self
+
+    def run(self):
+        try:
+            if not self.isCanceled():
+                self.result = self.prefetcher.fetch(self)
+        finally:
+            self.done.set()
+
+    def cancel(self):
+        backgroundthread.Task.cancel(self)
+        self.done.set()
+
+
+class PhotoPrefetcher(object):
+    """
+    Downloads photos and their backgrounds on a few workers sharing one keep-alive session, streaming
+    them into the temp folder. The current photo always goes first, followed by the look-ahead window.
+    The folder is kept below a byte budget by dropping the least recently shown photos that aren't
+    part of the current window.
+    """
+
+    def __init__(self, folder, budget, resolver):
+        self.folder = folder
+        self.budget = budget
+        self.resolver = resolver
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # item key: (path, background, size), least recently used first
+        self.size = 0
+        self.tasks = {}
+        self.wanted = ()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=PREFETCH_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.threader = backgroundthread.BackgroundThreader('photos', worker_count=PREFETCH_WORKERS)
+
+    def _key(self, item):
+        return item.playQueueItemID.asInt()
+
+    def get(self, item):
+        with self.lock:
+            entry = self.entries.get(self._key(item))
+            return entry and entry[:2] or None
+
+    def request(self, current, items):
+        """
+        Queues the current item and then items, in that order. Downloads for items that aren't wanted
+        anymore are dropped if they haven't started yet.
+        """
+        wanted = [current] + items
+        keys = [self._key(i) for i in wanted]
+
+        with self.lock:
+            self.wanted = keys
+
+            for key in list(self.tasks):
+                if key not in keys:
+                    self.tasks.pop(key).cancel()
+
+            # the current item becomes the most recently used one
+            for key in reversed(keys):
+                if key in self.entries:
+                    self.entries[key] = self.entries.pop(key)
+
+            new = []
+            currentTask = self.tasks.get(keys[0])
+            for item, key in zip(wanted, keys):
+                if key in self.entries or key in self.tasks:
+                    continue
+
+                self.tasks[key] = PhotoPrefetchTask().setup(item, self)
+                new.append(self.tasks[key])
+
+        if new:
+            self.threader.addTasksToFront(new)
+
+        if currentTask:
+            self.threader.moveToFront(currentTask)
+
+    def wait(self, item, timeout=PREFETCH_WAIT):
+        with self.lock:
+            task = self.tasks.get(self._key(item))
+
+        if not task:
+            return self.get(item)
+
+        end = time.time() + timeout
+        while not task.done.is_set() and time.time() < end:
+            if util.MONITOR.waitForAbort(0.1):
+                return None
+
+        return task.result
+
+    def fetch(self, task):
+        key = self._key(task.item)
+        paths = []
+        size = 0
+        try:
+            urls = self.resolver(task.item)
+            for url in urls or ():
+                path = os.path.join(self.folder, hashlib.sha1(url.encode('utf-8')).hexdigest())
+                if os.path.exists(path):
+                    size += os.path.getsize(path)
+                else:
+                    fetched = self._download(url, path, task)
+                    if fetched is None:
+                        break
+                    size += fetched
+
+                paths.append(path)
+        except Exception as e:
+            if self.wanted and key == self.wanted[0]:
+                util.ERROR("Couldn't load image: %s" % e, notify=True)
+            else:
+                util.DEBUG_LOG("Couldn't preload image: %s" % e)
+
+        with self.lock:
+            if self.tasks.get(key) is task:
+                del self.tasks[key]
+
+            if len(paths) != 2:
+                return None
+
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old[2]
+
+            self.entries[key] = (paths[0], paths[1], size)
+            self.size += size
+            self._trim()
+
+        return paths[0], paths[1]
+
+    def _download(self, url, path, task):
+        tmpPath = path + '.part'
+        r = self.session.get(url, allow_redirects=True, timeout=PREFETCH_TIMEOUT, stream=True)
+        try:
+            r.raise_for_status()
+            size = 0
+            with open(tmpPath, 'wb') as f:
+                for chunk in r.iter_content(PREFETCH_CHUNK_SIZE):
+                    if task.isCanceled():
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+        finally:
+            r.close()
+
+        if task.isCanceled():
+            self._remove(tmpPath)
+            return None
+
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+        return size
+
+    def _remove(self, *paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _trim(self):
+        for key in list(self.entries):
+            if self.size <= self.budget:
+                break
+
+            if key in self.wanted:
+                continue
+
+            path, background, size = self.entries.pop(key)
+            self.size -= size
+            self._remove(path, background)
+
+    def close(self):
+        self.threader.abort()
+        with self.lock:
+            for task in self.tasks.values():
+                task.cancel()
+            self.tasks = {}
+
+        # Canceled downloads stop at the next chunk; wait for them, so nothing writes to the folder once we return
+        self.threader.shutdown()
+        self.session.close()
+
 
 class PhotoWindow(kodigui.BaseWindow):
     xmlFile = 'script-plex-photo.xml'
@@ -43,7 +244,7 @@ class PhotoWindow(kodigui.BaseWindow):
 
     SLIDESHOW_INTERVAL = util.slideshowInterval
 
-    PHOTO_STACK_SIZE = 10
+    PHOTO_CACHE_SIZE = 100 * 1024 * 1024  # bytes of photos and backgrounds kept in the temp folder
     tempSubFolder = ("p4k", "photos")
 
     def __init__(self, *args, **kwargs):
@@ -64,7 +265,8 @@ class PhotoWindow(kodigui.BaseWindow):
         self.showPhotoTimeout = 0
         self.rotate = 0
         self.tempFolder = None
-        self.photoStack = []
+        self.prefetcher = None
+        self.direction = 1
         self.initialLoad = True
 
     def onFirstInit(self):
@@ -79,6 +281,7 @@ class PhotoWindow(kodigui.BaseWindow):
                 if not os.path.isdir(self.tempFolder):
                     util.ERROR()
 
+        self.prefetcher = PhotoPrefetcher(self.tempFolder, self.PHOTO_CACHE_SIZE, self.getPhotoURLs)
         self.pqueueList = kodigui.ManagedControlList(self, self.PQUEUE_LIST_ID, 14)
         self.setProperty('photo', 'script.plex/indicators/busy-photo.gif')
         self.getPlayQueue()
@@ -285,87 +488,72 @@ class PhotoWindow(kodigui.BaseWindow):
 
     def _showPhoto(self):
         """
-        load the current photo, preload the previous and the next one
+        show the current photo as soon as it's on disk, and preload the ones around it
         :return:
         """
         photo = self.playQueue.current()
-        next = self.playQueue.getNext()
-        loadItems = (photo, next, self.playQueue.getPrev())
-        for item in loadItems:
-            if item is not None:
-                item.softReload()
-
-        self.playerObject = plexplayer.PlexPhotoPlayer(photo)
+        if photo.type != "photo":
+            # showPhoto() skips these, but the queue may have moved on since; don't download them as images
+            util.DEBUG_LOG("NOT LOADING NON-PHOTO: %s" % photo)
+            return
 
-        addToStack = []
         try:
-            for item in loadItems:
-                if not item:
-                    continue
+            photo.softReload()
+            self.playerObject = plexplayer.PlexPhotoPlayer(photo)
+            self.prefetcher.request(photo, self.getPrefetchItems(photo))
 
-                if item.type != "photo":
-                    continue
-
-                meta = self.playerObject.build(item=item)
-                url = photo.server.getImageTranscodeURL(meta.get('url', ''), self.width, self.height)
-                bgURL = item.thumb.asTranscodedImageURL(self.width, self.height, blur=128, opacity=60,
-                                                        background=colors.noAlpha.Background)
-
-                isCurrent = item == photo
-                if isCurrent and not self.initialLoad:
+            cached = self.prefetcher.get(photo)
+            if not cached:
+                if not self.initialLoad:
                     self.setBoolProperty('is.updating', True)
+                cached = self.prefetcher.wait(photo)
 
-                path, background = self.getCachedPhotoData(url, bgURL)
-                if not (path and background):
-                    return
-
-                if (path, background) not in self.photoStack:
-                    if item == next:
-                        # move the next image to the top of the stack
-                        addToStack.insert(0, (path, background))
-                    else:
-                        addToStack.append((path, background))
+            if not cached:
+                return
 
-                if isCurrent:
-                    self._reallyShowPhoto(item, path, background)
-                    self.setBoolProperty('is.updating', False)
-                    self.initialLoad = False
-
-            # maintain cache folder
-            self.photoStack = addToStack + self.photoStack
-            if len(self.photoStack) > self.PHOTO_STACK_SIZE:
-                clean = self.photoStack[self.PHOTO_STACK_SIZE:]
-                self.photoStack = self.photoStack[:self.PHOTO_STACK_SIZE]
-                for remList in clean:
-                    for rem in remList:
-                        try:
-                            os.remove(rem)
-                        except:
-                            pass
+            self._reallyShowPhoto(photo, *cached)
+            self.initialLoad = False
         finally:
             self.setBoolProperty('is.updating', False)
 
-    def getCachedPhotoData(self, url, bgURL):
-        if not url:
-            return
+    def getPrefetchItems(self, photo):
+        """
+        the photos to preload, nearest first: the look-ahead window in the direction we're browsing, then the one
+        we came from
+        """
+        items = list(self.playQueue.items())
+        if photo not in items:
+            return []
+
+        pos = items.index(photo)
+        wrap = self.playQueue.isRepeat and not self.playQueue.isWindowed()
+        count = max(util.advancedSettings.photoPrefetchCount, 1)
+
+        prefetch = []
+        for offset in [self.direction * i for i in range(1, count + 1)] + [-self.direction]:
+            idx = pos + offset
+            if wrap:
+                idx %= len(items)
+            elif not 0 <= idx < len(items):
+                continue
 
-        basename = hashlib.sha1(url.encode('utf-8')).hexdigest()
-        tmpPath = os.path.join(self.tempFolder, basename)
-        tmpBgPath = os.path.join(self.tempFolder, "%s_bg" % basename)
-
-        for p, url in ((tmpPath, url), (tmpBgPath, bgURL)):
-            if not os.path.exists(p):# and not xbmc.getCacheThumbName(tmpFn):
-                try:
-                    r = requests.get(url, allow_redirects=True, timeout=10.0)
-                    r.raise_for_status()
-                except Exception as e:
-                    util.ERROR("Couldn't load image: %s" % e, notify=True)
-                    return None, None
-                else:
-                    with open(p, 'wb') as f:
-                        f.write(r.content)
+            item = items[idx]
+            if item.type == "photo" and item is not photo and item not in prefetch:
+                prefetch.append(item)
+
+        return prefetch
+
+    def getPhotoURLs(self, item):
+        # called from the prefetch workers
+        item.softReload(_batch=True)
+        meta = plexplayer.PlexPhotoPlayer(item).build()
+        if not meta:
+            return None
 
-        return tmpPath, tmpBgPath
+        url = item.server.getImageTranscodeURL(meta.get('url', ''), self.width, self.height)
+        bgURL = item.thumb.asTranscodedImageURL(self.width, self.height, blur=128, opacity=60,
+                                                background=colors.noAlpha.Background)
+        return url, bgURL
 
     def _reallyShowPhoto(self, photo, path, background):
         self.setRotation(0)
@@ -450,11 +638,13 @@ class PhotoWindow(kodigui.BaseWindow):
     def prev(self):
         if not self.playQueue.getPrev():
             return
+        self.direction = -1
         self.showPhoto(trigger=lambda: self.playQueue.prev())
 
     def next(self):
         if not self.playQueue.getNext():
             return
+        self.direction = 1
         self.showPhoto(trigger=lambda: self.playQueue.next())
 
     __next__ = next
@@ -476,6 +666,8 @@ class PhotoWindow(kodigui.BaseWindow):
 
     def doClose(self):
         self.pause()
+        if self.prefetcher:
+            self.prefetcher.close()
         shutil.rmtree(self.tempFolder, ignore_errors=True)
 
         kodigui.BaseWindow.doClose(self)
@@ -17,10 +17,11 @@ from . import optionsdialog
 from . import preplayutils
 from . import pagination
 
-from plexnet import plexplayer, media
+from plexnet import plexapp, plexplayer, media, metadatacache
 
 from lib import colors
 from lib import util
+from lib import player
 from lib import metadata
 
 from lib.util import T
@@ -79,7 +80,9 @@ class PrePlayWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.relatedPaginator = None
 
     def doClose(self):
+        plexapp.util.APP.off('metadata:updated', self.onMetadataUpdated)
         self.relatedPaginator = None
+        player.PREPARER.invalidate(self.video)
         kodigui.ControlledWindow.doClose(self)
 
     def onFirstInit(self):
@@ -90,6 +93,7 @@ class PrePlayWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.progressImageControl = self.getControl(self.PROGRESS_IMAGE_ID)
         self.setup()
         self.initialized = True
+        plexapp.util.APP.on('metadata:updated', self.onMetadataUpdated)
 
     def doAutoPlay(self):
         # First reload the video to get all the other info
@@ -100,8 +104,32 @@ class PrePlayWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.initialized = False
         self.video.reload()
         self.refreshInfo()
+        self.preparePlayback()
         self.initialized = True
 
+    def onMetadataUpdated(self, server=None, path=None, **kwargs):
+        # The video was shown from the metadata cache, the server has since sent something newer
+        if not self.initialized or server != self.video.getServer():
+            return
+
+        if str(self.video.ratingKey) not in metadatacache.itemKeys(path or ''):
+            return
+
+        util.DEBUG_LOG('PrePlay: Video changed on the server - refreshing')
+        self.initialized = False
+        self.video.reload(checkFiles=1, **VIDEO_RELOAD_KW)
+        self.refreshInfo()
+        self.preparePlayback()
+        self.initialized = True
+
+    def preparePlayback(self):
+        # Plain play always starts with the first version, select it now so the preparation matches
+        preplayutils.resetVersion(self.video)
+
+        # When there's progress, resume is asked for first and starting over is the other choice
+        viewOffset = self.video.viewOffset.asInt()
+        player.PREPARER.prepare(self.video, viewOffset and [viewOffset, 0] or [0])
+
     def refreshInfo(self):
         oldFocusId = self.getFocusId()
 
@@ -198,6 +226,8 @@ class PrePlayWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
             playerObject.build()
         playersettings.showDialog(video=self.video, non_playback=True)
         self.setAudioAndSubtitleInfo()
+        player.PREPARER.invalidate(self.video)
+        self.preparePlayback()
 
     def infoButtonClicked(self):
         opener.handleOpen(
@@ -474,6 +504,7 @@ class PrePlayWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.relatedPaginator = RelatedPaginator(self.relatedListControl, leaf_count=int(self.video.relatedCount),
                                                  parent_window=self)
 
+        self.preparePlayback()
         self.setInfo()
         self.fillExtras()
         hasPrev = self.fillRelated()
@@ -1,5 +1,4 @@
 from __future__ import absolute_import
-import time
 import threading
 
 from kodi_six import xbmcgui
@@ -11,7 +10,7 @@ from . import windowutils
 from lib import util
 from lib.kodijsonrpc import rpc
 
-from plexnet import plexapp
+from plexnet import plexapp, searchengine
 
 class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
     xmlFile = 'script-plex-search.xml'
@@ -109,8 +108,9 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         windowutils.UtilMixin.__init__(self)
         self.parentWindow = kwargs.get('parent_window')
         self.sectionID = kwargs.get('section_id')
-        self.resultsThread = None
-        self.updateResultsTimeout = 0
+        self.engine = None
+        self.hubSignatures = {}
+        self.resultsLock = threading.Lock()
         self.isActive = True
 
     def onFirstInit(self):
@@ -192,6 +192,8 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         self.edit = kodigui.SafeControlEdit(650, 651, self, key_callback=self.updateFromEdit, grab_focus=True)
         self.edit.setCompatibleMode(rpc.Application.GetProperties(properties=["version"])["version"]["major"] < 17)
 
+        self.engine = searchengine.SearchEngine(plexapp.SERVERMANAGER.selectedServer, self.searchCallback, count=10)
+
         self.setProperty('search.section', 'all')
         self.updateQuery()
 
@@ -234,25 +236,26 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
         self.updateResults()
 
     def updateResults(self):
-        self.updateResultsTimeout = time.time() + 1
-        if not self.resultsThread or not self.resultsThread.is_alive():
-            self.resultsThread = threading.Thread(target=self._updateResults, name='search.update')
-            self.resultsThread.start()
-
-    def _updateResults(self):
-        while time.time() < self.updateResultsTimeout and not util.MONITOR.waitForAbort(0.1):
-            pass
-
-        self._reallyUpdateResults()
-
-    def _reallyUpdateResults(self):
         query = self.edit.getText()
         if query:
-            with self.propertyContext('searching'):
-                hubs = plexapp.SERVERMANAGER.selectedServer.hubs(count=10, search_query=query, section=self.sectionID)
-                self.showHubs(hubs)
+            self.setProperty('searching', '1')
+            self.engine.search(query, section=self.sectionID)
         else:
-            self.clearHubs()
+            self.engine.cancel()
+            with self.resultsLock:
+                self.setProperty('searching', '')
+                self.clearHubs()
+
+    def searchCallback(self, query, section, hubs, final):
+        if not self.isActive:
+            return
+
+        with self.resultsLock:
+            # hubs is None if the search failed, the previous results stay
+            if hubs is not None:
+                self.showHubs(hubs, final=final)
+            if final:
+                self.setProperty('searching', '')
 
     def sectionClicked(self, controlID):
         section = self.SECTION_BUTTONS[controlID]
@@ -340,10 +343,7 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
 
         return mli
 
-    def showHubs(self, hubs):
-        self.clearHubs()
-        self.opaqueBackground(on=False)
-
+    def showHubs(self, hubs, final=True):
         allowed = None
         if self.getProperty('search.section') == 'movie':
             allowed = ('movie',)
@@ -355,6 +355,7 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
             allowed = ('photo', 'photodirectory')
 
         controlID = None
+        shown = set()
         i = 0
         for h in hubs:
             if allowed and h.type not in allowed:
@@ -364,11 +365,24 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
                 self.opaqueBackground()
                 cid = self.showHub(h, i)
                 controlID = controlID or cid
+                shown.add(cid)
                 i += 1
 
+        if not final:
+            # More hubs are on the way, the rest of the old results is cleaned up once they're all in
+            return
+
+        # Controls are updated in place, only those the new results don't use anymore get cleared
+        for controls in self.hubControls:
+            for control in controls.values():
+                if control and control.controlID not in shown and self.hubSignatures.pop(control.controlID, None) is not None:
+                    control.reset()
+
         if controlID:
             self.setProperty('no.results', '')
         else:
+            self.opaqueBackground(on=False)
+            self.setProperty('hub.focus', '')
             self.setProperty('no.results', '1')
 
     def showHub(self, hub, idx):
@@ -385,13 +399,18 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
 
         self.setProperty('hub.{0}'.format(itemListControl.controlID), hub.title)
 
+        # Keystrokes often don't change a hub's items, leave those controls alone
+        signature = tuple(hubItem.get('ratingKey') or hubItem.get('key') or hubItem.get('tag') for hubItem in hub.items)
+        if self.hubSignatures.get(itemListControl.controlID) == signature:
+            return itemListControl.controlID
+
         items = []
         for hubItem in hub.items:
             mli = self.createListItem(hubItem)
             items.append(mli)
 
-        itemListControl.reset()
-        itemListControl.addItems(items)
+        self.hubSignatures[itemListControl.controlID] = signature
+        itemListControl.replaceItems(items)
 
         return itemListControl.controlID
 
@@ -402,6 +421,7 @@ class SearchDialog(kodigui.BaseDialog, windowutils.UtilMixin):
             for control in controls.values():
                 if control:
                     control.reset()
+        self.hubSignatures = {}
         self.setProperty('hub.focus', '')
 
     def opaqueBackground(self, on=True):
@@ -418,6 +438,8 @@ def dialog(parent_window, section_id=None):
         try:
             w = SearchDialog.open(parent_window=parent_window, section_id=section_id)
             w.wait()
+            if w.engine:
+                w.engine.close()
             command = w.exitCommand or ''
             del w
             return command
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import re
 import time
+import bisect
 import threading
 import math
 
@@ -66,6 +67,61 @@ MARKERS = OrderedDict([
 FINAL_MARKER_NEGOFF = 1000
 
 
+class TimelineIndex(object):
+    """
+    Marker intervals and chapter starts of a video, converted and sorted once, so the per-tick marker
+    lookup, the next-boundary query and chapter skipping are bisects instead of scans.
+
+    The marker boundaries cut the timeline into segments, each knowing the marker shown in it: the
+    first one in markers order that covers it, as when scanning.
+    """
+
+    def __init__(self, markers=None, chapters=None):
+        intervals = []
+        for markerDef in markers or ():
+            marker = markerDef["marker"]
+            if marker:
+                intervals.append((int(marker.startTimeOffset),
+                                  math.ceil(float(marker.endTimeOffset)) - FINAL_MARKER_NEGOFF,
+                                  markerDef))
+
+        self.boundaries = sorted(set(b for start, end, markerDef in intervals for b in (start, end)))
+        self.segments = []
+        for boundary in self.boundaries:
+            for start, end, markerDef in intervals:
+                if start <= boundary < end:
+                    self.segments.append(markerDef)
+                    break
+            else:
+                self.segments.append(None)
+
+        chapters = sorted(chapters or (), key=lambda c: c.startTime())
+        self.chapters = chapters
+        self.chapterStarts = [c.startTime() for c in chapters]
+
+    def markerAt(self, offset):
+        idx = bisect.bisect_right(self.boundaries, offset) - 1
+        return idx >= 0 and self.segments[idx] or None
+
+    def nextBoundary(self, offset):
+        idx = bisect.bisect_right(self.boundaries, offset)
+        return idx < len(self.boundaries) and self.boundaries[idx] or None
+
+    def nextChapter(self, offset):
+        """
+        First chapter starting after offset
+        """
+        idx = bisect.bisect_right(self.chapterStarts, offset)
+        return self.chapters[idx] if idx < len(self.chapters) else None
+
+    def previousChapter(self, offset):
+        """
+        Last chapter starting at or before offset
+        """
+        idx = bisect.bisect_right(self.chapterStarts, offset) - 1
+        return self.chapters[idx] if idx >= 0 else None
+
+
 class SeekDialog(kodigui.BaseDialog):
     xmlFile = 'script-plex-seek_dialog.xml'
     path = util.ADDON.getAddonInfo('path')
@@ -117,6 +173,7 @@ class SeekDialog(kodigui.BaseDialog):
         self.bifURL = None
         self.baseURL = None
         self.hasBif = bool(self.bifURL)
+        self.lastBifOffset = None
         self.baseOffset = 0
         self._duration = 0
         self.offset = 0
@@ -152,6 +209,7 @@ class SeekDialog(kodigui.BaseDialog):
         # optimize
         self._enableMarkerSkip = plexapp.ACCOUNT.hasPlexPass()
         self._markers = None
+        self._timeline = None
         self._introSkipShownStarted = None
         self._introAutoSkipped = False
         self._creditsSkipShownStarted = None
@@ -231,9 +289,19 @@ class SeekDialog(kodigui.BaseDialog):
                     markers.append(m)
 
             self._markers = markers
+            if markers:
+                # the index may have been built before the video's markers were known
+                self._timeline = None
 
         return self._markers
 
+    @property
+    def timeline(self):
+        if not self._timeline:
+            self._timeline = TimelineIndex(self.markers, self.chapters)
+
+        return self._timeline
+
     def onFirstInit(self):
         try:
             self._onFirstInit()
@@ -670,20 +738,13 @@ class SeekDialog(kodigui.BaseDialog):
         lastSelectedOffset = self.selectedOffset
         util.DEBUG_LOG('chapter skipping from {0} with formawrd {1}'.format(lastSelectedOffset, forward))
         if forward:
-            nextChapters = [c for c in self.chapters if c.startTime() > lastSelectedOffset]
-            util.DEBUG_LOG('Found {0} chapters among {1}'.format(len(nextChapters), len(self.chapters)))
-            if len(nextChapters) == 0:
-                return False
-            chapter = nextChapters[0]
+            chapter = self.timeline.nextChapter(lastSelectedOffset)
         else:
-            startTimeLimit = lastSelectedOffset - 2000
-            if startTimeLimit < 0:
-                startTimeLimit = 0
-            lastChapters = [c for c in self.chapters if c.startTime() <= startTimeLimit]
-            util.DEBUG_LOG('Found {0} chapters among {1}'.format(len(lastChapters), len(self.chapters)))
-            if len(lastChapters) == 0:
-                return False
-            chapter = lastChapters[-1]
+            chapter = self.timeline.previousChapter(max(lastSelectedOffset - 2000, 0))
+
+        if chapter is None:
+            util.DEBUG_LOG('No chapter found among {0}'.format(len(self.chapters)))
+            return False
 
         util.DEBUG_LOG('New start time is {0}'.format(chapter.startTime()))
         self.skipByOffset(chapter.startTime() - lastSelectedOffset, without_osd=without_osd)
@@ -1015,31 +1076,39 @@ class SeekDialog(kodigui.BaseDialog):
         if not self.markers:
             return
 
-        for markerDef in self.markers:
-            marker = markerDef["marker"]
-            if marker:
-                if int(marker.startTimeOffset) <= self.offset < math.ceil(float(marker.endTimeOffset)) \
-                        - FINAL_MARKER_NEGOFF:
-                    # we've had a marker already; reset autoSkip state
-                    if self._currentMarker and self._currentMarker != markerDef:
-                        setattr(self, markerDef["markerAutoSkipped"], False)
+        markerDef = self.timeline.markerAt(self.offset)
+        if not markerDef:
+            self.setProperty('show.markerSkip', '')
+            return
 
-                    if getattr(self, markerDef["markerAutoSkip"], False) \
-                            and not getattr(self, markerDef["markerAutoSkipped"], False):
-                        return markerDef
+        # we've had a marker already; reset autoSkip state
+        if self._currentMarker and self._currentMarker != markerDef:
+            setattr(self, markerDef["markerAutoSkipped"], False)
 
-                    self.setProperty('show.markerSkip', '1')
+        if getattr(self, markerDef["markerAutoSkip"], False) \
+                and not getattr(self, markerDef["markerAutoSkipped"], False):
+            return markerDef
 
-                    timer = getattr(self, markerDef["markerAutoSkipShownTimer"])
+        self.setProperty('show.markerSkip', '1')
 
-                    if timer is None:
-                        setattr(self, markerDef["markerAutoSkipShownTimer"], time.time())
+        timer = getattr(self, markerDef["markerAutoSkipShownTimer"])
 
-                    else:
-                        if timer + getattr(self, markerDef["markerSkipBtnTimeout"]) <= time.time():
-                            self.setProperty('show.markerSkip_OSDOnly', '1')
-                    return markerDef
-                self.setProperty('show.markerSkip', '')
+        if timer is None:
+            setattr(self, markerDef["markerAutoSkipShownTimer"], time.time())
+
+        else:
+            if timer + getattr(self, markerDef["markerSkipBtnTimeout"]) <= time.time():
+                self.setProperty('show.markerSkip_OSDOnly', '1')
+        return markerDef
+
+    def nextMarkerBoundary(self, offset):
+        """
+        Offset (ms) of the next marker start or end after offset, so the player monitor can tick right on it
+        """
+        if not self.initialized or not self.markers:
+            return None
+
+        return self.timeline.nextBoundary(offset)
 
     def setup(self, duration, offset=0, bif_url=None, title='', title2='', chapters=None):
         self.title = title
@@ -1052,6 +1121,8 @@ class SeekDialog(kodigui.BaseDialog):
         self.offset = 0
         self._duration = duration
         self.chapters = chapters or []
+        self._markers = None
+        self._timeline = None
         self.bifURL = bif_url
         self.hasBif = bool(self.bifURL)
         if self.hasBif:
@@ -1071,6 +1142,16 @@ class SeekDialog(kodigui.BaseDialog):
 
         self.updateProgress()
 
+    def getBifImage(self, offset):
+        """
+        Local preview image for offset once the handler's BIF cache has the index, the server's image otherwise
+        """
+        direction = self.lastBifOffset is not None and offset - self.lastBifOffset or 0
+        self.lastBifOffset = offset
+
+        bifCache = self.handler.bifCache
+        return bifCache and bifCache.getFrame(offset, direction) or self.handler.player.playerObject.getBifUrl(offset)
+
     @property
     def duration(self):
         try:
@@ -1108,7 +1189,7 @@ class SeekDialog(kodigui.BaseDialog):
             self.selectionBox.setPosition(-50, 0)
         self.setProperty('time.selection', util.simplifiedTimeDisplay(offset))
         if self.hasBif:
-            self.setProperty('bif.image', self.handler.player.playerObject.getBifUrl(offset))
+            self.setProperty('bif.image', self.getBifImage(offset))
             self.bifImageControl.setPosition(bifx, 752)
 
         self.seekbarControl.setPosition(0, self.seekbarControl.getPosition()[1])
@@ -121,6 +121,8 @@ class VideoPlayerWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         self.timeout = None
         self.relatedPaginator = None
         self.onDeckPaginator = None
+        if self.next:
+            player.PREPARER.invalidate(self.next)
         kodigui.ControlledWindow.doClose(self)
         player.PLAYER.handler.sessionEnded()
 
@@ -347,6 +349,8 @@ class VideoPlayerWindow(kodigui.ControlledWindow, windowutils.UtilMixin):
         util.DEBUG_LOG('PostPlay: Showing video info')
         if self.next:
             self.next.reload(includeExtras=1, includeExtrasCount=10)
+            # Have the next video ready to go when the countdown ends or next is clicked
+            player.PREPARER.prepare(self.next, [self.resume and self.next.viewOffset.asInt() or 0])
 
         self.relatedPaginator = RelatedPaginator(self.relatedListControl,
                                                  leaf_count=int((self.prev or self.next).relatedCount),
@@ -3,24 +3,50 @@ from kodi_six import xbmc
 from kodi_six import xbmcplugin
 from kodi_six import xbmcgui
 import sys
+import json
 import base64
-from lib import _included_packages, plex, util
-from plexnet import audio, plexplayer, plexapp
-from plexnet import util as plexnetUtil
+
+# Only the fast path's imports live up here. Importing lib.util and plexnet costs more than the whole
+# fast path, so the full resolver loads them only when it's needed.
 
 HANDLE = int(sys.argv[1])
 
-BASE_LOG = util.LOG
 
+def loadPlex():
+    """
+    Imports the add-on's libraries to resolve a track ourselves.
+    """
+    from lib import _included_packages, plex, util  # noqa: F401
+    from plexnet import util as plexnetUtil
+
+    BASE_LOG = util.LOG
+
+    def LOG(msg):
+        BASE_LOG('(plugin) - {0}'.format(plexnetUtil.cleanToken(msg)))
+
+    util.LOG = LOG
+    return util
 
-def LOG(msg):
-    BASE_LOG('(plugin) - {0}'.format(plexnetUtil.cleanToken(msg)))
 
+def playStream(stream):
+    """
+    Hands Kodi the stream URL the add-on resolved when it queued the track. If the add-on has since
+    switched to another connection to that server, follow it.
+    """
+    info = json.loads(base64.urlsafe_b64decode(stream.encode('utf-8')).decode('utf-8'))
+    url = info['url']
 
-util.LOG = LOG
+    address = xbmc.getInfoLabel('Window(10000).Property(script.plex.connection.{0})'.format(info['server']))
+    if address and address != info['address'] and url.startswith(info['address']):
+        url = address + url[len(info['address']):]
 
+    xbmc.log('script.plex: (plugin) - Playing pre-resolved stream from {0}'.format(address or info['address']), xbmc.LOGDEBUG)
+    xbmcplugin.setResolvedUrl(HANDLE, True, xbmcgui.ListItem(path=url))
+
+
+def playTrack(track, util):
+    from plexnet import plexplayer, plexapp
 
-def playTrack(track):
     track.reload()
     apobj = plexplayer.PlexAudioPlayer(track)
     url = apobj.build()['url']
@@ -28,7 +54,7 @@ def playTrack(track):
         'X-Plex-Client-Profile-Name': 'Generic',
         'X-Plex-Client-Identifier': plexapp.util.INTERFACE.getGlobal('clientIdentifier')
     })
-    LOG('Playing URL: {0}'.format(url))
+    util.LOG('Playing URL: {0}'.format(url))
 
     return xbmcgui.ListItem(path=url)
 
@@ -38,13 +64,14 @@ def playVideo(video):
 
 
 def play(data):
+    util = loadPlex()
     try:
         from plexnet import plexobjects
 
         plexObject = plexobjects.PlexObject.deSerialize(base64.urlsafe_b64decode(data.encode('utf-8')))
 
         if plexObject.type == 'track':
-            listitem = playTrack(plexObject)
+            listitem = playTrack(plexObject, util)
         elif plexObject.type in ('episode', 'movie', 'clip'):
             listitem = playVideo(plexObject)
     except:
@@ -64,12 +91,19 @@ def main():
         data = sys.argv[2].lstrip('?')
 
         if path == 'play':
+            data, _, stream = data.partition('&stream=')
+            if stream:
+                try:
+                    playStream(stream)
+                    return
+                except Exception as e:
+                    xbmc.log('script.plex: (plugin) - Pre-resolved stream unusable, resolving the track: {0}'.format(e), xbmc.LOGINFO)
             play(data)
         else:  # This is a hack since it's both a plugin and a script. My Addons and Shortcuts otherwise can't launch the add-on
             xbmc.executebuiltin('Action(back)')  # This sometimes works to back out of the plugin directory display
             xbmc.executebuiltin('RunScript(script.plexmod)')
     except:
-        util.ERROR()
+        loadPlex().ERROR()
 
 
 main()